@@ -1,15 +1,43 @@
 from typing    import *
 from datetime  import datetime
+from math      import prod
 from enum      import StrEnum
-from SQLDomain import SQLDomain
+import operator
+from operator  import itemgetter
+from Utils     import Res, CustomErr
+from SQLDomain import SQLDomain, getLiteralDomain
+from SQLSchema import Schema
+
+type RowEvaluator[T] = Callable[[Sequence], T]
+""" A compiled expression: it takes a row, as the sequence of the values of its columns, and returns the result """
 
 class Attribute:
     def __init__(self, name:str) -> None:
         self.name = name
 
+    def getAttributes(self) -> list[Self]: return [self]
+
+    def compile(self, schema:Schema) -> Res[tuple[RowEvaluator, SQLDomain], Schema.ColumnNameErr|Schema.ColumnNameCollisionErr]:
+        return schema.getIdAndDomain(self.name).map(lambda column : (itemgetter(column[0]), column[1]))
+
     def __repr__(self) -> str:
         return self.name
 
+class Parameter:
+    """ Stands for a value that is only given once a prepared query is bound, positional parameters are named by their index """
+    class UnboundErr(CustomErr):
+        MSG = "Unbound parameter"
+        def __init__(self, name:str) -> None:
+            super().__init__(f"no value was given for parameter \"{name}\"")
+
+    def __init__(self, name:str) -> None:
+        self.name = name
+
+    def isPositional(self) -> bool: return self.name.isdigit()
+
+    def __repr__(self) -> str:
+        return "?" if self.isPositional() else f":{self.name}"
+
 MAX_PRIORITY = 2 # This should be inside MathOp but Python bad so I can't (conveniently)
 class MathOp(StrEnum):
     ADD = "+"
@@ -28,19 +56,63 @@ class MathOp(StrEnum):
         return self.getPriority() > other.getPriority()
 
     def exec[T](self, domain:SQLDomain, lhs:T, rhs:T) -> T:
-        match self:
-            case MathOp.ADD: return domain.add(lhs, rhs)
-            case MathOp.SUB: return domain.sub(lhs, rhs)
-            case MathOp.MUL: return domain.mul(lhs, rhs)
-            case MathOp.DIV: return domain.div(lhs, rhs)
-            case MathOp.MOD: return domain.mod(lhs, rhs)
+        return domain.getMathOperator(self.value, domain).unwrap()[0](lhs, rhs)
 
 type Literal = int|str|datetime
-type Operand = Literal|Attribute|MathExpr
+type Operand = Literal|Attribute|Parameter|MathExpr
+def getOperandAttributes(operand:Operand) -> list[Attribute]:
+    return operand.getAttributes() if isinstance(operand, Attribute|MathExpr) else []
+
+def getOperandParameters(operand:Operand) -> list[Parameter]:
+    match operand:
+        case Parameter(): return [operand]
+        case MathExpr():  return operand.getParameters()
+        case _:           return []
+
+def bindOperand(operand:Operand, values:dict[str, Literal]) -> Operand:
+    """ Replaces the parameters with their values """
+    match operand:
+        case Parameter(): return values[operand.name]
+        case MathExpr():  return MathExpr(bindOperand(operand.lhs, values), operand.op, bindOperand(operand.rhs, values))
+        case _:           return operand
+
+def getOperandCost(operand:Operand) -> int:
+    """ Roughly how much work computing the operand takes, counted in operands and operators """
+    return operand.getCost() if isinstance(operand, MathExpr) else 1
+
+def compileOperand(operand:Operand, schema:Schema) -> Res[tuple[RowEvaluator, SQLDomain], Exception]:
+    if isinstance(operand, Attribute|MathExpr): return operand.compile(schema)
+    if isinstance(operand, Parameter):          return Res.Err(Parameter.UnboundErr(operand.name))
+    return Res.Ok((lambda _ : operand, getLiteralDomain(operand)))
+
 class MathExpr:
     def __init__(self, lhs:Operand, op:Optional[MathOp] = None, rhs:Optional[Operand] = None) -> None:
         self.lhs, self.op, self.rhs = lhs, op, rhs
 
+    def getAttributes(self) -> list[Attribute]:
+        return getOperandAttributes(self.lhs) + getOperandAttributes(self.rhs)
+
+    def getParameters(self) -> list[Parameter]:
+        return getOperandParameters(self.lhs) + getOperandParameters(self.rhs)
+
+    def getCost(self) -> int:
+        return getOperandCost(self.lhs) + (self.op is not None) * (1 + getOperandCost(self.rhs))
+
+    def compile(self, schema:Schema) -> Res[tuple[RowEvaluator, SQLDomain], Exception]:
+        """ Returns the evaluator of the expression along with the domain of its result """
+        if (lhs := compileOperand(self.lhs, schema)).isErr(): return lhs
+        if self.op is None: return lhs
+        if (rhs := compileOperand(self.rhs, schema)).isErr(): return rhs
+
+        (lhs, lhsDomain), (rhs, rhsDomain) = lhs.unwrap(), rhs.unwrap()
+        if (mathOperator := lhsDomain.getMathOperator(self.op.value, rhsDomain)).isErr(): return mathOperator
+
+        fn, domain = mathOperator.unwrap()
+        if self.getAttributes(): return Res.Ok((lambda row : fn(lhs(row), rhs(row)), domain))
+
+        # Without attributes the result is always the same, so it's computed right away:
+        return Res.wrap(fn, lhs(()), rhs(())).map(lambda value : (lambda _ : value, domain))
+
     def _repr(item:Attribute|Literal|Self, indents :int, *, isLeftSide = False) -> str:
         return item.__repr__(indents, isLeftSide = isLeftSide) if isinstance(item, MathExpr) else item.__repr__()
 
@@ -71,26 +143,244 @@ class CompareOp(StrEnum):
             case CompareOp.GREATER:                          return domain.compareGrt(lhs, rhs)
             case CompareOp.LESS:                             return domain.compareLst(lhs, rhs)
 
+    def getOperator(self) -> Callable[[Any, Any], bool]:
+        """ The plain Python comparison, meant for values that went through SQLDomain.toComparable """
+        match self:
+            case CompareOp.EQUALS:                           return operator.eq
+            case CompareOp.NOT_EQUALS | CompareOp.DIFFERENT: return operator.ne
+            case CompareOp.GREATER_EQUALS:                   return operator.ge
+            case CompareOp.LESS_EQUALS:                      return operator.le
+            case CompareOp.GREATER:                          return operator.gt
+            case CompareOp.LESS:                             return operator.lt
+
+    def getDefaultSelectivity(self) -> float:
+        """ The fraction of rows a comparison is assumed to let through when nothing is known about the values """
+        match self:
+            case CompareOp.EQUALS:                           return 0.1
+            case CompareOp.NOT_EQUALS | CompareOp.DIFFERENT: return 0.9
+            case _:                                          return 1 / 3
+
+    def getNegated(self) -> Self:
+        """ Returns the operator that holds exactly when this one doesn't """
+        match self:
+            case CompareOp.EQUALS:                           return CompareOp.NOT_EQUALS
+            case CompareOp.NOT_EQUALS | CompareOp.DIFFERENT: return CompareOp.EQUALS
+            case CompareOp.GREATER_EQUALS:                   return CompareOp.LESS
+            case CompareOp.LESS_EQUALS:                      return CompareOp.GREATER
+            case CompareOp.GREATER:                          return CompareOp.LESS_EQUALS
+            case CompareOp.LESS:                             return CompareOp.GREATER_EQUALS
+
+    def getMirrored(self) -> Self:
+        """ Returns the operator that gives the same result once the operands are swapped """
+        match self:
+            case CompareOp.GREATER_EQUALS: return CompareOp.LESS_EQUALS
+            case CompareOp.LESS_EQUALS:    return CompareOp.GREATER_EQUALS
+            case CompareOp.GREATER:        return CompareOp.LESS
+            case CompareOp.LESS:           return CompareOp.GREATER
+            case _:                        return self
+
+def compileComparison(op:CompareOp, domain:SQLDomain, lhs:RowEvaluator, rhs:RowEvaluator) -> RowEvaluator[bool]:
+    compare = op.getOperator()
+    if domain.comparesPlainly(): return lambda row : compare(lhs(row), rhs(row))
+
+    key = domain.toComparable
+    return lambda row : compare(key(lhs(row)), key(rhs(row)))
+
 class CompareExpr:
-    def __init__(self, lhs:MathExpr, op:CompareOp, rhs:MathExpr) -> None:
+    def __init__(self, lhs:Operand, op:CompareOp, rhs:Operand) -> None:
         self.lhs, self.op, self.rhs = lhs, op, rhs
 
+    def getAttributes(self) -> list[Attribute]:
+        return getOperandAttributes(self.lhs) + getOperandAttributes(self.rhs)
+
+    def getParameters(self) -> list[Parameter]:
+        return getOperandParameters(self.lhs) + getOperandParameters(self.rhs)
+
+    def getConjuncts(self) -> list["Condition"]: return [self]
+
+    def getCost(self) -> int: return getOperandCost(self.lhs) + 1 + getOperandCost(self.rhs)
+
+    def estimateSelectivity(self, estimator:"SelectivityEstimator") -> float:
+        return self.op.getDefaultSelectivity()
+
+    def bind(self, values:dict[str, Literal]) -> "Condition":
+        return makeCondition(CompareExpr(bindOperand(self.lhs, values), self.op, bindOperand(self.rhs, values)))
+
+    def compile(self, schema:Schema) -> Res[RowEvaluator[bool], Exception]:
+        if (lhs := compileOperand(self.lhs, schema)).isErr(): return lhs
+        if (rhs := compileOperand(self.rhs, schema)).isErr(): return rhs
+
+        (lhs, lhsDomain), (rhs, rhsDomain) = lhs.unwrap(), rhs.unwrap()
+        if not lhsDomain.isComparableWith(rhsDomain): return Res.Err(SQLDomain.DomainMismatchErr(lhsDomain, rhsDomain))
+        
+        return Res.Ok(compileComparison(self.op, lhsDomain, lhs, rhs))
+
+    def __repr__(self) -> str:
+        return f"{self.lhs!r} {self.op} {self.rhs!r}"
+
 class LogicOp(StrEnum):
     OR  = "or"
     AND = "and"
 
-    def exec[T](self, domain:SQLDomain, lhs:T, rhs:T) -> bool:
+    def exec(self, lhs:bool, rhs:bool) -> bool:
         match self:
-            case LogicOp.OR: return domain.logicOr(lhs, rhs)
-            case LogicOp.AND: return domain.logicAnd(lhs, rhs)
+            case LogicOp.OR:  return lhs or rhs
+            case LogicOp.AND: return lhs and rhs
 
 class Predicate[T]:
-    def __init__(self, attr:Attribute, op:CompareOp, value:T) -> None:
+    def __init__(self, attr:Attribute, op:CompareOp, value:T|Attribute) -> None:
         self.attr, self.op, self.value = attr, op, value
+
+    def comparesAttributes(self) -> bool:
+        """ True when the predicate compares two columns instead of a column and a literal """
+        return isinstance(self.value, Attribute)
+
+    def isEquality(self) -> bool: return self.op == CompareOp.EQUALS
+
+    def getConjuncts(self) -> list["Condition"]: return [self]
+
+    def getCost(self) -> int: return 3 # an attribute, an operator and a value or another attribute
+
+    def estimateSelectivity(self, estimator:"SelectivityEstimator") -> float:
+        if (selectivity := estimator(self)) is not None: return selectivity
+        return self.op.getDefaultSelectivity()
+
+    def getAttributes(self) -> list[Attribute]:
+        return [self.attr, self.value] if self.comparesAttributes() else [self.attr]
+
+    def getParameters(self) -> list[Parameter]:
+        return getOperandParameters(self.value)
+
+    def bind(self, values:dict[str, Literal]) -> Self:
+        return Predicate(self.attr, self.op, bindOperand(self.value, values))
+
+    def compile(self, schema:Schema) -> Res[RowEvaluator[bool], Exception]:
+        """ Only needed when rows are evaluated one at a time, Table.where evaluates whole columns instead """
+        if (resolvedPred := self.resolve(schema)).isErr(): return resolvedPred
+
+        colId, domain, otherColId = resolvedPred.unwrap()
+        if otherColId is not None: return Res.Ok(compileComparison(self.op, domain, itemgetter(colId), itemgetter(otherColId)))
+
+        compare, value = self.op.getOperator(), domain.toComparable(self.value)
+        if domain.comparesPlainly(): return Res.Ok(lambda row : compare(row[colId], value))
+
+        key = domain.toComparable
+        return Res.Ok(lambda row : compare(key(row[colId]), value))
+
+    def resolve(self, schema:Schema) -> Res[tuple[int, SQLDomain, Optional[int]], Exception]:
+        """
+        Finds the column and domain of the predicate's attribute and, when the predicate compares two
+        attributes, the column of the second one.
+        """
+        if (column := schema.getIdAndDomain(self.attr.name)).isErr(): return column
+
+        colId, domain = column.unwrap()
+        if isinstance(self.value, Parameter): return Res.Err(Parameter.UnboundErr(self.value.name))
+        if not self.comparesAttributes():
+            if not domain.canValidate(self.value):
+                return Res.Err(SQLDomain.DomainValueErr(domain, self.value, f"invalid predicate comparing attribute \"{self.attr.name}\" of type {domain.TYPE} with value \"{self.value}\" of type {type(self.value)}"))
+            
+            return Res.Ok((colId, domain, None))
+
+        if (otherColumn := schema.getIdAndDomain(self.value.name)).isErr(): return otherColumn
+
+        otherColId, otherDomain = otherColumn.unwrap()
+        if not domain.isComparableWith(otherDomain): return Res.Err(SQLDomain.DomainMismatchErr(domain, otherDomain))
+        
+        return Res.Ok((colId, domain, otherColId))
     
     def isSatisfied(self, domain:SQLDomain[T], attrValueInTable:T) -> bool:
         return self.op.exec(domain, attrValueInTable, self.value)
 
+    def __repr__(self) -> str:
+        return f"{self.attr} {self.op} {self.value!r}"
+
+class LogicExpr:
+    """
+    Conditions joined by AND or by OR. They are checked in order, stopping as soon as one of them settles the
+    result, so the order they're in is the one they are expected to be fastest in, see ordered.
+    """
+    def __init__(self, op:LogicOp, conds:list["Condition"]) -> None:
+        self.op, self.conds = op, conds
+
+    def getConjuncts(self) -> list["Condition"]:
+        """ The conditions that must all hold """
+        return self.conds if self.op == LogicOp.AND else [self]
+
+    def getAttributes(self) -> list[Attribute]:
+        return [ attr for cond in self.conds for attr in cond.getAttributes() ]
+
+    def getParameters(self) -> list[Parameter]:
+        return [ param for cond in self.conds for param in cond.getParameters() ]
+
+    def getCost(self) -> int:
+        """ When all the conditions have to be checked """
+        return sum(cond.getCost() for cond in self.conds)
+
+    def estimateSelectivity(self, estimator:"SelectivityEstimator") -> float:
+        """ The conditions are assumed to be independent """
+        selectivities = [ cond.estimateSelectivity(estimator) for cond in self.conds ]
+        return prod(selectivities) if self.op == LogicOp.AND else 1 - prod(1 - selectivity for selectivity in selectivities)
+
+    def bind(self, values:dict[str, Literal]) -> "Condition":
+        return makeLogicExpr(self.op, [ cond.bind(values) for cond in self.conds ])
+
+    def ordered(self, estimator:"SelectivityEstimator") -> Self:
+        """ Returns a copy of the expression with its conditions in order of rank, see rankConditions """
+        return LogicExpr(self.op, rankConditions(self.conds, estimator, self.op))
+
+    def compile(self, schema:Schema) -> Res[RowEvaluator[bool], Exception]:
+        if (evaluators := Res.toOverallList([ cond.compile(schema) for cond in self.conds ])).isErr(): return evaluators
+
+        # Each evaluator only calls the next one when it can't settle the result on its own:
+        *evaluators, evaluator = evaluators.unwrap()
+        for lhs in reversed(evaluators):
+            if self.op == LogicOp.AND: evaluator = lambda row, lhs = lhs, rhs = evaluator : lhs(row) and rhs(row)
+            else:                      evaluator = lambda row, lhs = lhs, rhs = evaluator : lhs(row) or rhs(row)
+
+        return Res.Ok(evaluator)
+
+    def __repr__(self) -> str:
+        return "(" + f" {self.op.upper()} ".join(map(repr, self.conds)) + ")"
+
+type Condition = Predicate|CompareExpr|LogicExpr
+
+type SelectivityEstimator = Callable[[Predicate], Optional[float]]
+""" Estimates the fraction of rows that satisfy a predicate, None when it can't tell """
+
+def rankConditions(conds:list[Condition], estimator:SelectivityEstimator, op = LogicOp.AND) -> list[Condition]:
+    """
+    Sorts the conditions joined by op so that the work done by checking them in turn is expected to be the least: ANDs
+    stop at the first condition that fails, so the cheapest ones that discard the most rows go first, while ORs stop at
+    the first one that holds, so the cheapest ones that accept the most rows go first. The sort is stable, and the
+    expressions among the conditions are ordered as well.
+    """
+    def getRank(cond:Condition) -> float:
+        selectivity = cond.estimateSelectivity(estimator)
+        stopChance  = 1 - selectivity if op == LogicOp.AND else selectivity
+        return cond.getCost() / stopChance if stopChance > 0 else float("inf")
+
+    return sorted([ cond.ordered(estimator) if isinstance(cond, LogicExpr) else cond for cond in conds ], key = getRank)
+
+def makeLogicExpr(op:LogicOp, conds:list[Condition]) -> Condition:
+    """ Conditions joined by the same operator are flattened into a single expression """
+    conds = [ subCond for cond in conds for subCond in (cond.conds if isinstance(cond, LogicExpr) and cond.op == op else [cond]) ]
+    return conds[0] if len(conds) == 1 else LogicExpr(op, conds)
+
+def makeCondition(compExpr:CompareExpr) -> Condition:
+    """
+    Plain comparisons between an attribute and a value (or a parameter) or another attribute become Predicates, so
+    that they can be evaluated a whole column at a time.
+    """
+    match compExpr.lhs, compExpr.rhs:
+        case Attribute() as attr, Attribute() | Parameter() | int() | str() | datetime() as value:
+            return Predicate(attr, compExpr.op, value)
+
+        case Parameter() | int() | str() | datetime() as value, Attribute() as attr:
+            return Predicate(attr, compExpr.op.getMirrored(), value)
+
+    return compExpr
+
 def main() -> None:
     # a + (((b * c) / d) % e) - (f % (g * h)) + i
     e = MathExpr(Attribute("a"), MathOp.ADD, Attribute("b"))
@@ -0,0 +1,108 @@
+from Utils     import Res, CustomErr
+from typing    import *
+import operator
+from enum      import StrEnum
+from Predicate import Attribute
+from SQLDomain import SQLDomain, IntegerDomain, truncatedDiv
+from SQLSchema import Schema
+
+class Accumulator:
+    """
+    Computes an aggregate one value at a time: start makes the state of a group out of its first value, update
+    folds another value into the state and finish turns the state into the result.
+    """
+    class EmptyErr(CustomErr):
+        MSG = "Nothing to aggregate"
+        def __init__(self, name:str) -> None:
+            super().__init__(f"{name} has no result over no rows")
+
+    def __init__(self, colId:int, domain:SQLDomain, start:Callable[[Any], Any], update:Callable[[Any, Any], Any],
+                 finish :Callable[[Any], Any] = lambda state : state, emptyValue :Optional[Any] = None) -> None:
+        """ The domain is the one of the result, emptyValue is the result over no rows at all when there is one """
+        self.colId, self.domain, self.emptyValue = colId, domain, emptyValue
+        self.start, self.update, self.finish     = start, update, finish
+
+    def getEmptyResult(self) -> Any:
+        """ There are no NULLs, so aggregates without a result over no rows, like MIN or AVG, fail instead """
+        if self.emptyValue is None: raise Accumulator.EmptyErr(self.domain.actualName)
+        return self.emptyValue
+
+class Aggregate:
+    """ An aggregate function over a column, or over the rows themselves for COUNT(*) """
+    class Func(StrEnum):
+        COUNT = "COUNT"
+        SUM   = "SUM"
+        MIN   = "MIN"
+        MAX   = "MAX"
+        AVG   = "AVG"
+
+    class DomainErr(CustomErr):
+        MSG = "Unsupported aggregate"
+        def __init__(self, aggregate:"Aggregate", domain:SQLDomain) -> None:
+            super().__init__(f"cannot compute {aggregate} over attribute \"{domain.actualName}\" of type {domain.TYPE}")
+
+    def __init__(self, func:Func, attr :Optional[Attribute] = None) -> None:
+        """ Only COUNT can go without an attribute """
+        self.func, self.attr = func, attr
+
+    def getAttributes(self) -> list[Attribute]:
+        return [self.attr] if self.attr else []
+
+    def getName(self) -> str:
+        """ The name of the column holding the results, which is also how the aggregate is referred to """
+        return str(self)
+
+    def compile(self, schema:Schema) -> Res[Accumulator, Exception]:
+        if self.attr is None: colId, domain = 0, None
+        elif (column := schema.getIdAndDomain(self.attr.name)).isErr(): return column
+        else: colId, domain = column.unwrap()
+
+        match self.func:
+            # There are no NULLs, so counting a column is the same as counting the rows:
+            case Aggregate.Func.COUNT: return Res.Ok(Accumulator(colId, IntegerDomain(self.getName()),
+                lambda _ : 1, lambda count, _ : count + 1, emptyValue = 0))
+
+            case Aggregate.Func.SUM if isinstance(domain, IntegerDomain):
+                return Res.Ok(Accumulator(colId, IntegerDomain(self.getName()), lambda value : value, operator.add, emptyValue = 0))
+
+            case Aggregate.Func.AVG if isinstance(domain, IntegerDomain):
+                # There are only integers, so the average is rounded towards zero just like a division is:
+                return Res.Ok(Accumulator(colId, IntegerDomain(self.getName()), lambda value : (value, 1),
+                    lambda state, value : (state[0] + value, state[1] + 1), lambda state : truncatedDiv(*state)))
+
+            case Aggregate.Func.MIN | Aggregate.Func.MAX:
+                resultDomain = domain.copy()
+                resultDomain.name, resultDomain.actualName = self.getName().lower(), self.getName()
+                return Res.Ok(Accumulator(colId, resultDomain, lambda value : value, self.makeExtremum(domain)))
+
+        return Res.Err(Aggregate.DomainErr(self, domain))
+
+    def makeExtremum(self, domain:SQLDomain) -> Callable[[Any, Any], Any]:
+        """ Returns the update of MIN or MAX, which keeps the first value met among those the domain deems equal """
+        if domain.comparesPlainly(): return min if self.func == Aggregate.Func.MIN else max
+
+        key, isBetter = domain.toComparable, operator.lt if self.func == Aggregate.Func.MIN else operator.gt
+        return lambda state, value : value if isBetter(key(value), key(state)) else state
+
+    def __repr__(self) -> str:
+        return f"{self.func}({self.attr or '*'})"
+
+def main() -> None:
+    from SQLDomain import StringDomain
+
+    schema = Schema()
+    for domain in (IntegerDomain("Grade"), StringDomain("Name", 20)): schema.addColumn(domain)
+
+    rows = [ (30, "bob"), (18, "Alice"), (27, "alice"), (24, "Bob") ]
+    for aggregate in (Aggregate(Aggregate.Func.COUNT), Aggregate(Aggregate.Func.AVG, Attribute("Grade")),
+                      Aggregate(Aggregate.Func.MIN, Attribute("Name")), Aggregate(Aggregate.Func.SUM, Attribute("Name"))):
+        if (accumulator := aggregate.compile(schema)).isErr():
+            print(accumulator.err)
+            continue
+
+        accumulator = accumulator.unwrap()
+        state = accumulator.start(rows[0][accumulator.colId])
+        for row in rows[1:]: state = accumulator.update(state, row[accumulator.colId])
+        print(f"{aggregate} = {accumulator.finish(state)}")
+
+if __name__ == "__main__": main()
@@ -0,0 +1,93 @@
+from Utils        import Res
+from typing       import *
+from SQLQuery     import Query
+from SQLTable     import Table
+from SQLIndex     import Index, HashIndex, SortedIndex, makeIndex
+from Predicate    import Predicate, Parameter
+from TableManager import TableManager
+from SQLParallel  import ParallelScanner
+
+class QueryBatch:
+    """
+    Runs many queries together so that they share the work they have in common:
+    - queries with the same FROM and WHERE clauses compute their filtered product once, then each of them just
+      selects its columns from it.
+    - when enough of the other queries compare the same column of a table with a value, a temporary index on that
+      column is built in a single pass over it, and it answers all of them.
+    """
+    SHARED_SCAN_MIN_QUERIES = 4
+    def __init__(self, tableManager:TableManager, scanner :Optional[ParallelScanner] = None) -> None:
+        self.tableManager, self.scanner = tableManager, scanner
+
+    def run(self, queries:list[Query]) -> list[Res[Table, Exception]]:
+        """ The results are in the same order as the queries """
+        results :list[Optional[Res[Table, Exception]]] = [None] * len(queries)
+        tables  :list[Optional[list[Table]]]           = [None] * len(queries)
+        for queryId, query in enumerate(queries):
+            if (queryTables := self.tableManager.getTables(query.tableNames)).isErr(): results[queryId] = queryTables
+            else:                                                                     tables[queryId]  = queryTables.unwrap()
+
+        productGroups :dict[tuple, list[int]] = {}
+        for queryId, query in enumerate(queries):
+            if tables[queryId] is not None: productGroups.setdefault(QueryBatch.getProductKey(query), []).append(queryId)
+
+        sharedScanCandidates :list[int] = []
+        for queryIds in productGroups.values():
+            # Grouped queries can't select their columns from a shared result, as they may aggregate different ones:
+            if len(queryIds) == 1 or queries[queryIds[0]].isGrouped(): sharedScanCandidates.extend(queryIds)
+            else:                  self.runSharingProduct(queries, tables, results, queryIds)
+
+        self.addSharedScanIndexes(queries, tables, sharedScanCandidates)
+        for queryId in sharedScanCandidates:
+            query, queryTables = queries[queryId], tables[queryId]
+            results[queryId] = query.plan(queryTables).flatMap(lambda plan : plan.run(queryTables, self.scanner))
+
+        return results
+
+    def getProductKey(query:Query) -> tuple:
+        """
+        Static, queries with the same key compute the same rows, only their SELECT clauses can differ. Conditions are
+        told apart by their representation, which spells out their whole tree.
+        """
+        return (tuple(name.lower() for name in query.tableNames), repr(query.wherePred),
+            tuple((str(sortKey), isDescending) for sortKey, isDescending in query.orderBy), query.limit, query.offset, query.isGrouped())
+
+    def runSharingProduct(self, queries:list[Query], tables:list[Optional[list[Table]]], results:list, queryIds:list[int]) -> None:
+        query, queryTables = queries[queryIds[0]], tables[queryIds[0]]
+
+        productQuery = Query()
+        productQuery.setColumnNames("*")
+        productQuery.setTableNames(*query.tableNames)
+        if query.wherePred: productQuery.setWherePredicate(query.wherePred)
+        productQuery.setOrderBy(query.orderBy)
+        productQuery.setLimit(query.limit, query.offset)
+
+        # The product keeps the full schema of the FROM clause, so columns are resolved as if each query ran on its own:
+        product = productQuery.plan(queryTables).flatMap(lambda plan : plan.run(queryTables, self.scanner))
+        for queryId in queryIds:
+            results[queryId] = product.flatMap(lambda product, queryId = queryId : product.select(queries[queryId].columnNames))
+
+    def addSharedScanIndexes(self, queries:list[Query], tables:list[Optional[list[Table]]], queryIds:list[int]) -> None:
+        """ Gives the queries that can share a scan a copy of their table with a temporary index for it """
+        scans :dict[tuple[int, int], list[int]] = {} # query ids by table and column
+        for queryId in queryIds:
+            query, queryTables = queries[queryId], tables[queryId]
+            pred = query.wherePred
+            if len(queryTables) != 1 or not isinstance(pred, Predicate) or pred.comparesAttributes() or isinstance(pred.value, Parameter):
+                continue
+
+            if pred.op not in SortedIndex.OPERATORS or (resolvedPred := pred.resolve(queryTables[0].schema)).isErr(): continue
+            if queryTables[0].getIndex(colId := resolvedPred.unwrap()[0], pred.op) is None:
+                scans.setdefault((id(queryTables[0]), colId), []).append(queryId)
+
+        for (_, colId), scanQueryIds in scans.items():
+            if len(scanQueryIds) < QueryBatch.SHARED_SCAN_MIN_QUERIES: continue
+
+            table = tables[scanQueryIds[0]][0]
+            ops   = { queries[queryId].wherePred.op for queryId in scanQueryIds }
+            kind  = Index.Kind.HASH if HashIndex.OPERATORS.issuperset(ops) else Index.Kind.SORTED
+
+            if (index := makeIndex(kind, table.columns[colId], table.schema.domains[colId])).isErr(): continue
+
+            indexedTable = table.withIndex(colId, index.unwrap())
+            for queryId in scanQueryIds: tables[queryId] = [indexedTable]
@@ -0,0 +1,82 @@
+from Utils      import Res, CustomErr
+from typing     import *
+import asyncio, json, time, argparse, statistics
+from SQLServer  import readMessage, writeMessage
+
+class SQLClient:
+    """ A connection to an SQLServer """
+    class ServerErr(CustomErr):
+        MSG = "Query failed on the server"
+        def __init__(self, serverErr:str) -> None:
+            super().__init__(serverErr.rstrip(".")) # the server's error already ends its sentence
+
+    def __init__(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        """ Private constructor """
+        self.reader, self.writer = reader, writer
+
+    async def connect(host :Optional[str] = None, port :Optional[int] = None, unixPath :Optional[str] = None) -> Self:
+        """ Static, connects to the Unix socket when given its path, to the TCP port otherwise """
+        if unixPath: return SQLClient(*await asyncio.open_unix_connection(unixPath))
+        return SQLClient(*await asyncio.open_connection(host, port))
+
+    async def query(self, programText:str) -> Res[dict[str, Any], Exception]:
+        """ Returns the response of the server, whose "result" is the table rendered as text """
+        writeMessage(self.writer, programText)
+        await self.writer.drain()
+        if (response := await readMessage(self.reader)) is None: return Res.Err(ConnectionError("the server closed the connection"))
+
+        response = json.loads(response)
+        return Res.Ok(response) if response["status"] == "ok" else Res.Err(SQLClient.ServerErr(response["error"]))
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+class LoadReport:
+    def __init__(self, latencies:list[float], errorsAmt:int, elapsed:float) -> None:
+        self.latencies, self.errorsAmt, self.elapsed = sorted(latencies), errorsAmt, elapsed
+
+    def getPercentile(self, percent:float) -> float:
+        """ Nearest rank, in seconds """
+        return self.latencies[min(int(len(self.latencies) * percent / 100), len(self.latencies) - 1)]
+
+    def __repr__(self) -> str:
+        if not self.latencies: return f"No query completed, {self.errorsAmt} errors."
+
+        percentiles = ", ".join(f"p{percent} {self.getPercentile(percent) * 1000:.2f}ms" for percent in (50, 90, 99, 99.9))
+        return (
+            f"{len(self.latencies)} queries in {self.elapsed:.2f}s ({len(self.latencies) / self.elapsed:.1f} queries/s), {self.errorsAmt} errors\n" +
+            f"latency: mean {statistics.fmean(self.latencies) * 1000:.2f}ms, {percentiles}, max {self.latencies[-1] * 1000:.2f}ms")
+
+async def generateLoad(programTexts:list[str], clientsAmt:int, queriesAmt:int, **address) -> LoadReport:
+    """ Each client sends queriesAmt queries, one after the other, going through the given ones in a loop """
+    latencies :list[float] = []
+    errorsAmt = 0
+    async def runClient(clientId:int) -> None:
+        nonlocal errorsAmt
+        client = await SQLClient.connect(**address)
+        try:
+            for queryId in range(queriesAmt):
+                start = time.perf_counter()
+                if (await client.query(programTexts[(clientId + queryId) % len(programTexts)])).isErr(): errorsAmt += 1
+                else: latencies.append(time.perf_counter() - start)
+
+        finally: await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*map(runClient, range(clientsAmt)))
+    return LoadReport(latencies, errorsAmt, time.perf_counter() - start)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Measures the throughput and latency of an SQLServer under load.")
+    parser.add_argument("queries", nargs = "+", help = "queries sent by the clients, in turn")
+    parser.add_argument("--host",    default = "127.0.0.1")
+    parser.add_argument("--port",    default = 5432, type = int)
+    parser.add_argument("--unix",    help = "path of a Unix socket to connect to instead of a TCP port")
+    parser.add_argument("--clients", default = 16,  type = int)
+    parser.add_argument("--count",   default = 100, type = int, help = "amount of queries sent by each client")
+    args = parser.parse_args()
+
+    print(asyncio.run(generateLoad(args.queries, args.clients, args.count, host = args.host, port = args.port, unixPath = args.unix)))
+
+if __name__ == "__main__": main()
@@ -0,0 +1,201 @@
+from typing    import *
+from array     import array
+from sys       import getsizeof
+from itertools import compress, repeat, chain
+from datetime  import datetime
+from Utils     import BaseClassErr
+from SQLDomain import SQLDomain, IntegerDomain, StringDomain, DateDomain
+
+class Column[T]:
+    """
+    Typed storage for the values of a single table column. Columns are only appended to while a table is being
+    built, after that they are never modified, which allows tables to share them.
+    """
+    class BCE(BaseClassErr): CLASS_NAME = "Column"
+
+    def __len__(self) -> int:
+        raise Column.BCE("__len__")
+
+    def __getitem__(self, rowId:int) -> T:
+        raise Column.BCE("__getitem__")
+
+    def __iter__(self) -> Iterator[T]:
+        return map(self.__getitem__, range(len(self)))
+
+    def append(self, value:T) -> None:
+        raise Column.BCE("append")
+
+    def extend(self, values:Iterable[T]) -> None:
+        for value in values: self.append(value)
+
+    def take(self, rowIds:Iterable[int]) -> Self:
+        """ Returns a new column made of the values at the given rows, in the given order """
+        raise Column.BCE("take")
+
+    def slice(self, rows:range) -> Self:
+        """ Like take, for a range of rows, subclasses copy their buffers in one go instead of row by row """
+        return self.take(rows)
+
+    def getMemoryUsage(self) -> int:
+        """ Approximate, in bytes """
+        raise Column.BCE("getMemoryUsage")
+
+    def copy(self) -> Self:
+        return self.take(range(len(self)))
+
+    def iterKeys(self, domain:SQLDomain[T]) -> Iterator[Hashable]:
+        """ Iterates over the values as keys that compare with plain Python operators like the domain compares values """
+        return map(domain.toComparable, self)
+
+    def iterKeysIn(self, domain:SQLDomain[T], rows:range) -> Iterator[Hashable]:
+        """ Like iterKeys, for a range of rows only """
+        return map(domain.toComparable, map(self.__getitem__, rows))
+
+    def toKey(self, domain:SQLDomain[T], value:T) -> Hashable:
+        """ Converts a value from outside the column into the same kind of key iterKeys produces """
+        return domain.toComparable(value)
+
+    def findRows(self, domain:SQLDomain[T], compare:Callable[[Any, Any], bool], value:T) -> list[int]:
+        """ Returns the ids of the rows for which compare(rowValue, value) holds, going through the column in one pass """
+        return list(self.iterFoundRows(domain, compare, value))
+
+    def iterFoundRows(self, domain:SQLDomain[T], compare:Callable[[Any, Any], bool], value:T, rowRanges :Optional[list[range]] = None) -> Iterator[int]:
+        """ Lazy version of findRows, only going through the given ranges of rows (all of them by default) """
+        key = self.toKey(domain, value)
+        if rowRanges is None: return compress(range(len(self)), map(compare, self.iterKeys(domain), repeat(key)))
+        return chain.from_iterable(compress(rows, map(compare, self.iterKeysIn(domain, rows), repeat(key))) for rows in rowRanges)
+
+class IntegerColumn(Column[int]):
+    def __init__(self, data :Optional[array] = None) -> None:
+        self.data = array('q') if data is None else data
+
+    def __len__(self)               -> int: return len(self.data)
+    def __getitem__(self, rowId:int) -> int: return self.data[rowId]
+    def __iter__(self)    -> Iterator[int]: return iter(self.data)
+
+    def iterKeys(self, domain:IntegerDomain) -> Iterator[int]:
+        return iter(self.data)
+
+    def iterKeysIn(self, domain:IntegerDomain, rows:range) -> Iterator[int]:
+        return iter(memoryview(self.data)[rows.start:rows.stop])
+
+    def append(self, value:int) -> None:
+        self.data.append(value)
+
+    def extend(self, values:Iterable[int]) -> None:
+        self.data.extend(values)
+
+    def take(self, rowIds:Iterable[int]) -> Self:
+        return IntegerColumn(array('q', map(self.data.__getitem__, rowIds)))
+
+    def slice(self, rows:range) -> Self:
+        (sliced := array('q')).frombytes(memoryview(self.data)[rows.start:rows.stop].cast("B"))
+        return IntegerColumn(sliced)
+
+    def getMemoryUsage(self) -> int: return getsizeof(self.data)
+
+class DateColumn(Column[datetime]):
+    """ Dates are stored as their ordinals (days since 01/01/0001) """
+    def __init__(self, data :Optional[array] = None) -> None:
+        self.data = array('q') if data is None else data
+
+    def __len__(self)                    -> int: return len(self.data)
+    def __getitem__(self, rowId:int) -> datetime: return datetime.fromordinal(self.data[rowId])
+    def __iter__(self)    -> Iterator[datetime]: return map(datetime.fromordinal, self.data)
+
+    def iterKeys(self, domain:DateDomain) -> Iterator[int]:
+        return iter(self.data)
+
+    def iterKeysIn(self, domain:DateDomain, rows:range) -> Iterator[int]:
+        return iter(memoryview(self.data)[rows.start:rows.stop])
+
+    def toKey(self, domain:DateDomain, value:datetime) -> int:
+        return value.toordinal()
+
+    def append(self, value:datetime) -> None:
+        self.data.append(value.toordinal())
+
+    def extend(self, values:Iterable[datetime]) -> None:
+        self.data.extend(map(datetime.toordinal, values))
+
+    def take(self, rowIds:Iterable[int]) -> Self:
+        return DateColumn(array('q', map(self.data.__getitem__, rowIds)))
+
+    def slice(self, rows:range) -> Self:
+        (sliced := array('q')).frombytes(memoryview(self.data)[rows.start:rows.stop].cast("B"))
+        return DateColumn(sliced)
+
+    def getMemoryUsage(self) -> int: return getsizeof(self.data)
+
+class StringColumn(Column[str]):
+    """
+    Dictionary encoded: every distinct string is stored once and rows only hold its code. The dictionary is
+    append-only so it can be shared by all the columns taken from this one, while slices get their own.
+    """
+    def __init__(self, codes :Optional[array] = None, values :Optional[list[str]] = None, codesByValue :Optional[dict[str, int]] = None) -> None:
+        self.codes        = array('i') if codes  is None else codes
+        self.values       = []         if values is None else values
+        self.codesByValue = {}         if codesByValue is None else codesByValue
+
+    def __len__(self)               -> int: return len(self.codes)
+    def __getitem__(self, rowId:int) -> str: return self.values[self.codes[rowId]]
+    def __iter__(self)    -> Iterator[str]: return map(self.values.__getitem__, self.codes)
+
+    def iterKeys(self, domain:StringDomain) -> Iterator[str]:
+        # Each distinct value is converted only once:
+        return map(list(map(domain.toComparable, self.values)).__getitem__, self.codes)
+
+    def iterKeysIn(self, domain:StringDomain, rows:range) -> Iterator[str]:
+        return map(domain.toComparable, map(self.values.__getitem__, memoryview(self.codes)[rows.start:rows.stop]))
+
+    def iterFoundRows(self, domain:StringDomain, compare:Callable[[Any, Any], bool], value:str, rowRanges :Optional[list[range]] = None) -> Iterator[int]:
+        # The comparison is done once per distinct value, then the rows just look up the outcome of their code:
+        key = self.toKey(domain, value)
+        isCodeMatching = list(map(compare, map(domain.toComparable, self.values), repeat(key)))
+        if rowRanges is None: return compress(range(len(self)), map(isCodeMatching.__getitem__, self.codes))
+
+        codes = memoryview(self.codes)
+        return chain.from_iterable(compress(rows, map(isCodeMatching.__getitem__, codes[rows.start:rows.stop])) for rows in rowRanges)
+
+    def append(self, value:str) -> None:
+        if (code := self.codesByValue.get(value)) is None:
+            code = self.codesByValue[value] = len(self.values)
+            self.values.append(value)
+
+        self.codes.append(code)
+
+    def take(self, rowIds:Iterable[int]) -> Self:
+        return StringColumn(array('i', map(self.codes.__getitem__, rowIds)), self.values, self.codesByValue)
+
+    def slice(self, rows:range) -> Self:
+        """
+        The slice stays small when pickled, e.g. to be sent to another process, however many distinct values the
+        whole column has: the dictionary is only shared when it's no bigger than the slice, otherwise the slice only
+        keeps the values its rows use, re-encoded.
+        """
+        # The codes may be a view on a mapped file, which must be copied for the slice to be picklable:
+        (codes := array('i')).frombytes(memoryview(self.codes)[rows.start:rows.stop].cast("B"))
+        if len(self.values) <= len(codes): return StringColumn(codes, self.values, self.codesByValue)
+
+        usedCodes = dict.fromkeys(codes)
+        values    = list(map(self.values.__getitem__, usedCodes))
+        newCodes  = dict(zip(usedCodes, range(len(values))))
+        return StringColumn(array('i', map(newCodes.__getitem__, codes)), values, dict(zip(values, range(len(values)))))
+
+    def getMemoryUsage(self) -> int:
+        """ The whole dictionary is counted, even when it's shared with other columns """
+        return getsizeof(self.codes) + getsizeof(self.values) + getsizeof(self.codesByValue) + sum(map(getsizeof, self.values))
+
+def makeColumn(domain:SQLDomain) -> Column:
+    match domain:
+        case IntegerDomain(): return IntegerColumn()
+        case DateDomain():    return DateColumn()
+        case StringDomain():  return StringColumn()
+        case _:               raise SQLDomain.BCE("makeColumn")
+
+def main() -> None:
+    column = makeColumn(StringDomain("Name", 40))
+    for name in ("John Doe", "Alice Bob", "John Doe"): column.append(name)
+    print(list(column), column.values, column.codes)
+
+if __name__ == "__main__": main()
@@ -1,5 +1,6 @@
 from typing   import *
-from datetime import datetime
+from datetime import datetime, timedelta
+import operator
 from Utils    import formatIntoDetails, CustomErr, BaseClassErr, Res
 
 class SQLDomain[T]:
@@ -7,10 +8,28 @@ class SQLDomain[T]:
     class DomainSyntaxErr(CustomErr): MSG = "Couldn't parse string as valid domain"
     class DomainValueErr(CustomErr):
         MSG = "Failed to parse value into expected domain type"
-        def __init__(self, domain:"SQLDomain", value, details = "") -> None:
-            super().__init__(f"could not parse \"{value}\" into {domain.TYPE} domain type" + formatIntoDetails(details))
+        def __init__(self, domain:"SQLDomain", value, details = "", rowId :Optional[int] = None) -> None:
+            super().__init__(f"could not parse \"{value}\"" + f" at row {rowId}" * (rowId is not None) +
+                f" into {domain.TYPE} domain type" + formatIntoDetails(details))
+
+    class DomainColumnErr(CustomErr):
+        MSG = "Failed to parse column into expected domain type"
+        def __init__(self, domain:"SQLDomain", rows:range, details = "") -> None:
+            super().__init__(f"could not parse rows {rows.start} to {rows.stop - 1} into {domain.TYPE} domain type, though each of " +
+                "their values can be parsed on its own" + formatIntoDetails(details))
+
+    class DomainMismatchErr(CustomErr):
+        MSG = "Incompatible domains"
+        def __init__(self, lhs:"SQLDomain", rhs:"SQLDomain") -> None:
+            super().__init__(f"cannot compare attribute \"{lhs.actualName}\" of type {lhs.TYPE} with attribute \"{rhs.actualName}\" of type {rhs.TYPE}")
+
+    class DomainOpErr(CustomErr):
+        MSG = "Unsupported operation"
+        def __init__(self, lhs:"SQLDomain", op:str, rhs:"SQLDomain") -> None:
+            super().__init__(f"cannot compute \"{lhs.actualName} {op} {rhs.actualName}\" between types {lhs.TYPE} and {rhs.TYPE}")
 
     TYPE = "default"
+    MATH_OPERATORS :dict[str, Callable[[T, T], T]] = {}
     def __init__(self, name:str) -> None:
         self.name       = name.lower()
         self.actualName = name
@@ -18,9 +37,50 @@ class SQLDomain[T]:
     def canValidate(self, value:T) -> bool:
         raise SQLDomain.BCE("canValidate")
 
-    def parseValue(self, valueStr:str) -> Res[T, BCE]:
-        raise SQLDomain.BCE("parseValue")
+    def convertValue(self, valueStr:str) -> T:
+        """ Raises a ValueError if the string isn't a valid value of the domain """
+        raise SQLDomain.BCE("convertValue")
+
+    def convertValues(self, valueStrs:Sequence[str]) -> list[T]:
+        """ Bulk version of convertValue, subclasses override it with faster ways of converting a whole column """
+        return list(map(self.convertValue, valueStrs))
+
+    def parseValue(self, valueStr:str) -> Res[T, "SQLDomain.DomainValueErr"]:
+        return Res.wrap(self.convertValue, valueStr).mapErr(
+            lambda valueErr : SQLDomain.DomainValueErr(self, valueStr, str(valueErr)))
+
+    def parseValues(self, valueStrs:Sequence[str], firstRowId = 0) -> Res[list[T], "SQLDomain.DomainValueErr|SQLDomain.DomainColumnErr"]:
+        """ Parses a whole column at once, an error names the row (counting from firstRowId) of the offending value """
+        try: return Res.Ok(self.convertValues(valueStrs))
+        except ValueError as valueErr: bulkErr = valueErr
+
+        # Values are only checked one by one once the column is known to be invalid:
+        for rowId, valueStr in enumerate(valueStrs, firstRowId):
+            try: self.convertValue(valueStr)
+            except ValueError as valueErr: return Res.Err(SQLDomain.DomainValueErr(self, valueStr, str(valueErr), rowId))
+
+        # The bulk conversion rejected the column without any of its values being invalid on its own:
+        return Res.Err(SQLDomain.DomainColumnErr(self, range(firstRowId, firstRowId + len(valueStrs)), str(bulkErr)))
     
+    def isComparableWith(self, other:"SQLDomain") -> bool:
+        return self.TYPE == other.TYPE
+
+    def comparesPlainly(self) -> bool:
+        """ Whether toComparable can be skipped because it doesn't change the values """
+        return type(self).toComparable is SQLDomain.toComparable
+
+    def getMathOperator(self, op:str, rhs:"SQLDomain") -> Res[tuple[Callable[[T, Any], Any], "SQLDomain"], "SQLDomain.DomainOpErr"]:
+        """ Returns the function computing "lhs op rhs" for a lhs of this domain and a rhs of the other one, along with the domain of the result """
+        if self.isComparableWith(rhs) and op in self.MATH_OPERATORS: return Res.Ok((self.MATH_OPERATORS[op], self))
+        return Res.Err(SQLDomain.DomainOpErr(self, op, rhs))
+
+    def toComparable(self, value:T) -> Hashable:
+        """
+        Converts the value into a key that compares (and hashes) with plain Python operators exactly like the
+        domain compares values, so that the conversion can be done once instead of at every comparison.
+        """
+        return value
+
     def compareEqs(self, lhs:T, rhs:T) -> bool:
         return lhs == rhs
     
@@ -39,6 +99,10 @@ class SQLDomain[T]:
     def compareLst(self, lhs:T, rhs:T) -> bool:
         return lhs < rhs
     
+    def getTypeStr(self) -> str:
+        """ The inverse of parseDomain """
+        return self.TYPE
+
     def __repr__(self) -> str:
         return f"{self.actualName} : {self.TYPE}"
     
@@ -65,17 +129,41 @@ def parseDomain(name:str, dType:str) -> Res[SQLDomain, SQLDomain.DomainSyntaxErr
         ).mapErr(lambda valueErr : SQLDomain.DomainSyntaxErr(
             f"varchar domain expected integer \"maxLenght\" argument, {valueErr}"))
 
+def getLiteralDomain(value:int|str|datetime) -> SQLDomain:
+    """ The domain literals are treated as when they appear in expressions """
+    match value:
+        case int():      return IntegerDomain(str(value))
+        case str():      return StringDomain(f"\"{value}\"", len(value))
+        case datetime(): return DateDomain(value.strftime("%d\\%m\\%Y"))
+
+def truncatedDiv(lhs:int, rhs:int) -> int:
+    """ Rounds towards zero like SQL does, instead of towards -inf like "//" """
+    quotient = abs(lhs) // abs(rhs)
+    return quotient if (lhs < 0) == (rhs < 0) else -quotient
+
+def truncatedMod(lhs:int, rhs:int) -> int:
+    return lhs - rhs * truncatedDiv(lhs, rhs)
+
 class IntegerDomain(SQLDomain[int]):
     TYPE = "integer"
+    MATH_OPERATORS = { "+" : operator.add, "-" : operator.sub, "*" : operator.mul, "/" : truncatedDiv, "%" : truncatedMod }
+    def getMathOperator(self, op:str, rhs:SQLDomain) -> Res[tuple[Callable[[int, Any], Any], SQLDomain], SQLDomain.DomainOpErr]:
+        # Days can be added to a date from either side:
+        if isinstance(rhs, DateDomain) and op == "+": return Res.Ok((lambda days, date : date + timedelta(days = days), rhs))
+        return super().getMathOperator(op, rhs)
+
     def canValidate(self, value:int) -> bool:
         return isinstance(value, int)
 
-    def parseValue(self, valueStr:str) -> Res[int, SQLDomain.DomainValueErr]:
-        return Res.wrap(int, valueStr).mapErr(
-            lambda valueErr : SQLDomain.DomainValueErr(self, valueStr, str(valueErr)))
+    def convertValue(self, valueStr:str) -> int:
+        return int(valueStr)
+
+    def convertValues(self, valueStrs:Sequence[str]) -> list[int]:
+        return list(map(int, valueStrs))
 
 class StringDomain(SQLDomain[str]):
     TYPE = "varchar"
+    MATH_OPERATORS = { "+" : operator.add }
     def __init__(self, name:str, maxLen:int) -> None:
         super().__init__(name)
         self.maxLen = maxLen
@@ -86,10 +174,17 @@ class StringDomain(SQLDomain[str]):
     def canValidate(self, value:str) -> bool:
         return isinstance(value, str) and self.isWithinMaxLen(value)
     
-    def parseValue(self, valueStr:str) -> Res[str, SQLDomain.DomainValueErr]:
-        return Res.Ok(valueStr) if self.isWithinMaxLen(valueStr) else Res.Err(
-            SQLDomain.DomainValueErr(self, valueStr, f"value exceeds max length ({self.maxLen})"))
+    def convertValue(self, valueStr:str) -> str:
+        if not self.isWithinMaxLen(valueStr): raise ValueError(f"value exceeds max length ({self.maxLen})")
+        return valueStr
+
+    def convertValues(self, valueStrs:Sequence[str]) -> list[str]:
+        if max(map(len, valueStrs), default = 0) > self.maxLen: raise ValueError(f"value exceeds max length ({self.maxLen})")
+        return list(valueStrs)
     
+    def toComparable(self, value:str) -> str:
+        return value.lower()
+
     def compareEqs(self, lhs:str, rhs:str) -> bool:
         return super().compareEqs(lhs.lower(), rhs.lower())
 
@@ -108,6 +203,9 @@ class StringDomain(SQLDomain[str]):
     def compareLst(self, lhs:str, rhs:str) -> bool:
         return super().compareLst(lhs.lower(), rhs.lower())
     
+    def getTypeStr(self) -> str:
+        return f"{self.TYPE}({self.maxLen})"
+
     def __repr__(self) -> str:
         return super().__repr__() + f"({self.maxLen})"
 
@@ -116,16 +214,36 @@ class StringDomain(SQLDomain[str]):
 
 class DateDomain(SQLDomain[datetime]):
     TYPE = "date"
+    def getMathOperator(self, op:str, rhs:SQLDomain) -> Res[tuple[Callable[[datetime, Any], Any], SQLDomain], SQLDomain.DomainOpErr]:
+        if isinstance(rhs, IntegerDomain) and op == "+": return Res.Ok((lambda date, days : date + timedelta(days = days), self))
+        if isinstance(rhs, IntegerDomain) and op == "-": return Res.Ok((lambda date, days : date - timedelta(days = days), self))
+        if isinstance(rhs, DateDomain)    and op == "-":
+            return Res.Ok((lambda lhs, rhs : (lhs - rhs).days, IntegerDomain(f"{self.actualName} - {rhs.actualName}")))
+
+        return super().getMathOperator(op, rhs)
+
     def canValidate(self, value:datetime) -> bool:
         return isinstance(value, datetime)
 
+    def convertDate(valueStr:str) -> datetime:
+        """ Static, dates written exactly as dd/mm/yyyy skip strptime, which is slow """
+        if len(valueStr) == 10 and valueStr[2] == valueStr[5] == '/' and (digits := valueStr[:2] + valueStr[3:5] + valueStr[6:]).isascii() and digits.isdigit():
+            try: return datetime(int(valueStr[6:]), int(valueStr[3:5]), int(valueStr[:2]))
+            except ValueError: pass # strptime gives the actual error
+
+        return datetime.strptime(valueStr, "%d/%m/%Y")
+
     def parseDate(valueStr:str) -> Res[datetime, Exception]:
         """Static"""
-        return Res.wrap(datetime.strptime, valueStr, "%d/%m/%Y")
-    
-    def parseValue(self, valueStr:str) -> Res[datetime, SQLDomain.DomainValueErr]:
-        return DateDomain.parseDate(valueStr).mapErr(
-            lambda valueErr : SQLDomain.DomainValueErr(self, valueStr, str(valueErr)))
+        return Res.wrap(DateDomain.convertDate, valueStr)
+
+    def convertValue(self, valueStr:str) -> datetime:
+        return DateDomain.convertDate(valueStr)
+
+    def convertValues(self, valueStrs:Sequence[str]) -> list[datetime]:
+        # Dates repeat a lot within a column, so each distinct one is only converted once:
+        datesByStr = { valueStr : DateDomain.convertDate(valueStr) for valueStr in set(valueStrs) }
+        return list(map(datesByStr.__getitem__, valueStrs))
 
 def main() -> None:
     print(DateDomain("BirthDate"))
@@ -0,0 +1,93 @@
+from Utils     import BaseClassErr, CustomErr, Res
+from typing    import *
+from enum      import StrEnum
+from array     import array
+from sys       import getsizeof
+from bisect    import bisect_left, bisect_right
+from SQLDomain import SQLDomain, IntegerDomain, StringDomain, DateDomain
+from SQLColumn import Column, makeColumn
+from Predicate import CompareOp
+
+class Index:
+    """
+    Finds the rows of a column whose value compares in a given way with a key, without going through the whole
+    column. Keys are the ones Column.iterKeys gives, so indexes on strings are case-insensitive like their domain.
+    Found rows always come in ascending order, i.e. in the same order a scan would find them.
+    """
+    class BCE(BaseClassErr): CLASS_NAME = "Index"
+    class IndexDomainErr(CustomErr):
+        MSG = "Cannot index column"
+        def __init__(self, domain:SQLDomain) -> None:
+            super().__init__(f"\"{domain.actualName}\" of type {domain.TYPE}")
+
+    class Kind(StrEnum):
+        HASH   = "hash"
+        SORTED = "sorted"
+
+    OPERATORS :set[CompareOp] = set()
+    def supports(self, op:CompareOp) -> bool:
+        return op in self.OPERATORS
+
+    def findRows(self, op:CompareOp, key:Hashable) -> Iterable[int]:
+        raise Index.BCE("findRows")
+
+    def getMemoryUsage(self) -> int:
+        """ Approximate, in bytes """
+        raise Index.BCE("getMemoryUsage")
+
+class HashIndex(Index):
+    """ O(1) lookups, only for equalities """
+    OPERATORS = { CompareOp.EQUALS }
+    def __init__(self, column:Column, domain:SQLDomain) -> None:
+        self.buckets :dict[Hashable, array] = {}
+        for rowId, key in enumerate(column.iterKeys(domain)):
+            if (bucket := self.buckets.get(key)) is None: bucket = self.buckets[key] = array('q')
+            bucket.append(rowId)
+
+    def findRows(self, op:CompareOp, key:Hashable) -> Iterable[int]:
+        return self.buckets.get(key, ())
+
+    def getMemoryUsage(self) -> int:
+        return getsizeof(self.buckets) + sum(map(getsizeof, self.buckets.values()))
+
+class SortedIndex(Index):
+    """ O(log n) lookups, for equalities and range comparisons """
+    OPERATORS = { CompareOp.EQUALS, CompareOp.LESS, CompareOp.LESS_EQUALS, CompareOp.GREATER, CompareOp.GREATER_EQUALS }
+    def __init__(self, column:Column, domain:SQLDomain) -> None:
+        keys = list(column.iterKeys(domain))
+
+        # The sort is stable, so equal keys keep their rows in ascending order:
+        self.rowIds = array('q', sorted(range(len(keys)), key = keys.__getitem__))
+        self.keys   = [ keys[rowId] for rowId in self.rowIds ]
+
+    def findRows(self, op:CompareOp, key:Hashable) -> Iterable[int]:
+        match op:
+            case CompareOp.EQUALS:         start, end = bisect_left(self.keys, key),  bisect_right(self.keys, key)
+            case CompareOp.LESS:           start, end = 0,                            bisect_left(self.keys, key)
+            case CompareOp.LESS_EQUALS:    start, end = 0,                            bisect_right(self.keys, key)
+            case CompareOp.GREATER:        start, end = bisect_right(self.keys, key), len(self.keys)
+            case CompareOp.GREATER_EQUALS: start, end = bisect_left(self.keys, key),  len(self.keys)
+            case _:                        raise Index.BCE("findRows")
+
+        # A range of keys can hold any rows, so they have to be put back in order:
+        return self.rowIds[start:end] if op == CompareOp.EQUALS else sorted(self.rowIds[start:end])
+
+    def getMemoryUsage(self) -> int:
+        return getsizeof(self.rowIds) + getsizeof(self.keys)
+
+def makeIndex(kind:Index.Kind, column:Column, domain:SQLDomain) -> Res[Index, Index.IndexDomainErr]:
+    if not isinstance(domain, (IntegerDomain, StringDomain, DateDomain)): return Res.Err(Index.IndexDomainErr(domain))
+
+    match kind:
+        case Index.Kind.HASH:   return Res.Ok(HashIndex(column, domain))
+        case Index.Kind.SORTED: return Res.Ok(SortedIndex(column, domain))
+
+def main() -> None:
+    domain = StringDomain("Name", 40)
+    column = makeColumn(domain)
+    for name in ("John Doe", "Alice Bob", "john doe", "Bob"): column.append(name)
+
+    print(list(makeIndex(Index.Kind.HASH,   column, domain).unwrap().findRows(CompareOp.EQUALS, "john doe")))
+    print(list(makeIndex(Index.Kind.SORTED, column, domain).unwrap().findRows(CompareOp.LESS, "bob")))
+
+if __name__ == "__main__": main()
@@ -1,25 +1,114 @@
-from Utils        import compareCaseInsensitive, Res
+from Utils        import compareCaseInsensitive, Res, LRUCache
+from typing       import *
+import sys
 from enum         import StrEnum
 from SQLParser    import SQLParser
+from SQLQuery     import Query, PreparedQuery
+from SQLBatch     import QueryBatch
+from SQLParallel  import ParallelScanner
+from SQLTable     import Table
+from SQLRenderer  import Renderer, makeRenderer
 from TableManager import TableManager
 
 class SQLInterpreter:
-    def __init__(self, tableManager:TableManager) -> None:
-        self.parser, self.tableManager = SQLParser(), tableManager
+    PARSED_QUERIES_CACHE_SIZE = 256
+    RESULTS_CACHE_BUDGET      = 64 << 20 # bytes
+    DISPLAYED_ROWS_LIMIT      = 1000
+    class ParsedQuery:
+        def __init__(self, key:str, query:Query) -> None:
+            self.key, self.query = key, query
+            self.tableVersions :Optional[list[int]] = None # the versions of its tables when it last ran
+
+    def __init__(self, tableManager:TableManager, parsedQueriesCacheSize = PARSED_QUERIES_CACHE_SIZE, resultsCacheBudget :Optional[int] = None,
+                 scanner :Optional[ParallelScanner] = None) -> None:
+        """ Results are only cached when given a budget (in bytes) for them, and scans only run in parallel when given a scanner """
+        self.parser, self.tableManager, self.scanner = SQLParser(), tableManager, scanner
+        self.parsedQuery :Optional[SQLInterpreter.ParsedQuery] = None
+
+        # Queries (and the plans they keep) by normalized text:
+        self.parsedQueries :LRUCache[str, SQLInterpreter.ParsedQuery] = LRUCache(parsedQueriesCacheSize)
+
+        # Results by normalized text and versions of the tables they were computed on:
+        self.results :Optional[LRUCache[tuple[str, tuple[int, ...]], Table]] = None
+        if resultsCacheBudget is not None: self.results = LRUCache(resultsCacheBudget, Table.getMemoryUsage)
+
+        self.setOutput(Renderer.Format.TABLE)
+
+    def setOutput(self, format:Renderer.Format, rowsLimit :Optional[int] = None, stream :Optional[TextIO] = None) -> None:
+        """ How results are written, and to which stream (the standard output by default), showing at most rowsLimit rows """
+        self.renderer, self.rowsLimit, self.outputStream = makeRenderer(format), rowsLimit, stream
     
     def parseAndRun(self, programText:str) -> Res[None, Exception]:
         if (parsingRes := self.parse(programText)).isErr(): return parsingRes
         return self.run()
     
-    def parse(self, programText:str) -> Res[None, Exception]:
-        return self.parser.parse(programText)
+    def parse(self, programText:str, *, isVerbose = True) -> Res[None, Exception]:
+        queryKey = self.parser.tokenizer.normalize(programText)
+        if (parsedQuery := self.parsedQueries.get(queryKey, self.isUpToDate)) is not None:
+            self.parsedQuery = parsedQuery
+            return Res.Ok(None)
+
+        if (parsingRes := self.parser.parse(programText, isVerbose = isVerbose)).isErr(): return parsingRes
+
+        # The parser builds a new query each time, so the cached one is never modified:
+        self.parsedQuery = SQLInterpreter.ParsedQuery(queryKey, self.parser.parsedQuery)
+        self.parsedQueries.put(queryKey, self.parsedQuery)
+        return Res.Ok(None)
+
+    def prepare(self, programText:str) -> Res[PreparedQuery, Exception]:
+        """ The query can hold parameters, either positional ("?") or named (":name"), in place of its values """
+        return self.parse(programText).map(lambda _ : PreparedQuery(self.parsedQuery.query, self.tableManager))
+
+    def runBatch(self, programTexts:list[str]) -> list[Res[Table, Exception]]:
+        """ Runs the queries together, sharing the work they have in common, and returns their results in order """
+        results :list[Optional[Res[Table, Exception]]] = [None] * len(programTexts)
+        queries :list[tuple[int, SQLInterpreter.ParsedQuery]] = []
+        for queryId, programText in enumerate(programTexts):
+            if (parsingRes := self.parse(programText, isVerbose = False)).isErr(): results[queryId] = parsingRes
+            else:                                                                 queries.append((queryId, self.parsedQuery))
+
+        batchResults = QueryBatch(self.tableManager, self.scanner).run([ parsedQuery.query for _, parsedQuery in queries ])
+        for (queryId, parsedQuery), result in zip(queries, batchResults):
+            results[queryId] = result
+            if result.isOk(): parsedQuery.tableVersions = self.getTableVersions(parsedQuery.query)
+
+        return results
+
+    def runScript(self, path:str) -> Res[list[Res[Table, Exception]], Exception]:
+        """ Runs the queries of a .sql file as a batch """
+        def readScript() -> str:
+            with open(path) as fd: return fd.read()
+
+        return Res.wrap(readScript).map(lambda script : self.runBatch(self.parser.tokenizer.splitStatements(script)))
+
+    def isUpToDate(self, parsedQuery:ParsedQuery) -> bool:
+        """ Whether none of the tables of the query was reloaded since the query last ran """
+        return parsedQuery.tableVersions in (None, self.getTableVersions(parsedQuery.query))
+
+    def getTableVersions(self, query:Query) -> list[int]:
+        return [ self.tableManager.getVersion(name) for name in query.tableNames ]
     
     def run(self) -> Res[None, Exception]:
         print("Running query..")
-        if (runRes := self.parser.parsedQuery.run(self.tableManager)).isErr(): return runRes
+        if (runRes := self.runQuery()).isErr(): return runRes
         
-        print(runRes.unwrap())
+        self.parsedQuery.tableVersions = self.getTableVersions(self.parsedQuery.query)
+        self.renderer.render(runRes.unwrap(), self.outputStream or sys.stdout, self.rowsLimit)
         return Res.Ok(None)
+
+    def runQuery(self) -> Res[Table, Exception]:
+        query = self.parsedQuery.query
+        if self.results is None: return query.run(self.tableManager, self.scanner)
+
+        # The tables are loaded first, so that the versions are the ones the query is going to run on:
+        if (tables := self.tableManager.getTables(query.tableNames)).isErr(): return tables
+        
+        resultKey = (self.parsedQuery.key, tuple(self.getTableVersions(query)))
+        if (result := self.results.get(resultKey)) is not None: return Res.Ok(result)
+        if (result := query.run(self.tableManager, self.scanner)).isErr(): return result
+
+        self.results.put(resultKey, result.unwrap())
+        return result
     
 #TODO: rewrite all of this using a state machine.
 class UserInputCommand(StrEnum):
@@ -27,8 +116,9 @@ class UserInputCommand(StrEnum):
 
 def main():
     print("Welcome to my Snake is QL, a very bad SQL interpreter written in Python.")
-    tableManager = TableManager.create("Student", "Exam", "Course").unwrap()
-    interpreter  = SQLInterpreter(tableManager)
+    tableManager = TableManager.discover().unwrap()
+    interpreter  = SQLInterpreter(tableManager, resultsCacheBudget = SQLInterpreter.RESULTS_CACHE_BUDGET)
+    interpreter.setOutput(Renderer.Format.TABLE, SQLInterpreter.DISPLAYED_ROWS_LIMIT)
 
     while True:
         nextLine    = ""
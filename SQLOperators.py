@@ -0,0 +1,324 @@
+from Utils        import BaseClassErr
+from typing       import *
+import pickle, heapq, tempfile
+from sys          import getsizeof
+from itertools    import compress, repeat, islice, batched, chain
+from operator     import itemgetter
+from Predicate    import RowEvaluator, Condition
+from SQLDomain    import SQLDomain
+from SQLSchema    import Schema
+from SQLTable     import Table
+from SQLAggregate import Accumulator
+
+def makeRowProjector(colIds:list[int]) -> Callable[[Sequence], tuple]:
+    # itemgetter only returns a tuple when it gets more than one item:
+    if len(colIds) == 1: return lambda row, colId = colIds[0] : (row[colId],)
+    return itemgetter(*colIds)
+
+class Operator:
+    """
+    A step of the execution of a query. Iterating over an operator pulls its rows (as tuples) one at a time from
+    the operators below it, so rows are only ever materialized when an operator can't do without it.
+    """
+    class BCE(BaseClassErr): CLASS_NAME = "Operator"
+
+    def __init__(self, schema:Schema) -> None:
+        self.schema = schema
+
+    def __iter__(self) -> Iterator[tuple]:
+        raise Operator.BCE("__iter__")
+
+    def materialize(self, name = "") -> Table:
+        return Table.fromRows(name, self.schema, self)
+
+class ScanOp(Operator):
+    """ Reads the rows of a table, only building the tuples of the rows that get through the filters """
+    def __init__(self, table:Table, colIds:list[int], findRowIds :Optional[Callable[[], Iterator[int]]] = None, filters :list[RowEvaluator[bool]] = []) -> None:
+        """ findRowIds lazily finds the candidate rows, the filters (compiled on the table's schema) then check each of them """
+        super().__init__(table.schema.project(colIds))
+        self.table, self.colIds, self.findRowIds, self.filters = table, colIds, findRowIds, filters
+
+    def __iter__(self) -> Iterator[tuple]:
+        rowIds = self.findRowIds() if self.findRowIds else None
+        if not self.filters: return self.table.iterRows(rowIds, self.colIds)
+
+        rows = self.table.iterRows(rowIds)
+        for evaluator in self.filters: rows = filter(evaluator, rows)
+        return map(makeRowProjector(self.colIds), rows)
+
+class FilterOp(Operator):
+    def __init__(self, child:Operator, evaluator:RowEvaluator[bool]) -> None:
+        super().__init__(child.schema)
+        self.child, self.evaluator = child, evaluator
+
+    def __iter__(self) -> Iterator[tuple]:
+        return filter(self.evaluator, self.child)
+
+class ProjectOp(Operator):
+    def __init__(self, child:Operator, schema:Schema, colIds:list[int]) -> None:
+        super().__init__(schema)
+        self.child, self.colIds = child, colIds
+
+    def __iter__(self) -> Iterator[tuple]:
+        return map(makeRowProjector(self.colIds), self.child)
+
+class LimitOp(Operator):
+    """ Skips offset rows then stops pulling rows from below as soon as limit rows (all of them when None) went through """
+    def __init__(self, child:Operator, limit:Optional[int], offset = 0) -> None:
+        super().__init__(child.schema)
+        self.child, self.limit, self.offset = child, limit, offset
+
+    def __iter__(self) -> Iterator[tuple]:
+        return islice(self.child, self.offset, None if self.limit is None else self.offset + self.limit)
+
+def spillRows(rows:Iterable[tuple], file :Optional[IO[bytes]] = None) -> IO[bytes]:
+    """ Appends the rows to the file, by default to a new temporary one which is deleted once closed """
+    file = file or tempfile.TemporaryFile()
+    for batch in batched(rows, Table.ROWS_BATCH_SIZE): pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+    return file
+
+def iterSpilledRows(file:IO[bytes]) -> Iterator[tuple]:
+    """ Reads back all the rows spilled to the file """
+    file.seek(0)
+    while True:
+        try: batch = pickle.load(file)
+        except EOFError: return
+
+        yield from batch
+
+class Descending:
+    """ Wraps a sort key so that it sorts in reverse order """
+    __slots__ = ("key",)
+    def __init__(self, key:Any) -> None:
+        self.key = key
+
+    def __lt__(self, other:Self) -> bool: return other.key < self.key
+    def __eq__(self, other:Self) -> bool: return self.key == other.key
+
+def makeSortKeys(sortKeys:list[tuple[int, SQLDomain, bool]]) -> list[tuple[Callable[[tuple], Any], bool]]:
+    """ Returns the key function of each column along with whether it sorts in descending order """
+    # Keys go through their domain, so that e.g. strings sort case-insensitively just like they compare:
+    return [ (itemgetter(colId) if domain.comparesPlainly() else lambda row, colId = colId, key = domain.toComparable : key(row[colId]), isDescending)
+        for colId, domain, isDescending in sortKeys ]
+
+class SortOp(Operator):
+    """
+    Sorts the rows, those with equal keys staying in the order they came in. When only the first maxRowsAmt rows are
+    needed they are kept in a bounded heap. Otherwise the rows are sorted in runs that fit in the memory budget,
+    and when there's more than one run they are spilled to temporary files and merged.
+    """
+    MEMORY_BUDGET = 256 << 20 # bytes
+    def __init__(self, child:Operator, sortKeys:list[tuple[Callable[[tuple], Any], bool]], maxRowsAmt :Optional[int] = None, memoryBudget :Optional[int] = None) -> None:
+        """ sortKeys are the key functions of the columns to sort on, along with whether they sort in descending order """
+        super().__init__(child.schema)
+        self.child, self.sortKeys, self.maxRowsAmt = child, sortKeys, maxRowsAmt
+        self.memoryBudget = SortOp.MEMORY_BUDGET if memoryBudget is None else memoryBudget
+
+        # Reversing keeps sorts stable, so keys only need to be wrapped when they don't all go in the same direction:
+        self.isReversed = all(isDescending for _, isDescending in sortKeys)
+        getters = [ get if isDescending == self.isReversed else lambda row, get = get : Descending(get(row)) for get, isDescending in sortKeys ]
+        self.sortKey = getters[0] if len(getters) == 1 else lambda row : tuple([ get(row) for get in getters ])
+
+    def __iter__(self) -> Iterator[tuple]:
+        # nsmallest and nlargest are stable, just like sorting:
+        if self.maxRowsAmt is not None:
+            return iter((heapq.nlargest if self.isReversed else heapq.nsmallest)(self.maxRowsAmt, self.child, key = self.sortKey))
+
+        return self.iterSorted()
+
+    def sort(self, rows:list[tuple]) -> list[tuple]:
+        """ In place """
+        if all(isDescending == self.isReversed for _, isDescending in self.sortKeys): rows.sort(key = self.sortKey, reverse = self.isReversed)
+        else:
+            # Sorting on each key in turn, the most significant one last, gives the same order without wrapping any key:
+            for get, isDescending in reversed(self.sortKeys): rows.sort(key = get, reverse = isDescending)
+
+        return rows
+
+    def iterSorted(self) -> Iterator[tuple]:
+        run   :list[tuple]     = []
+        runs  :list[IO[bytes]] = [] # spilled
+        rowSize = None # bytes, estimated on the first rows
+        for rows in batched(self.child, Table.ROWS_BATCH_SIZE):
+            if rowSize is None: rowSize = sum(getsizeof(row) + sum(map(getsizeof, row)) for row in rows) / len(rows)
+
+            run.extend(rows)
+            if len(run) * rowSize > self.memoryBudget:
+                runs.append(spillRows(self.sort(run)))
+                run = []
+
+        if not runs: return iter(self.sort(run))
+
+        runs.append(spillRows(self.sort(run)))
+        return self.merge(runs)
+
+    def merge(self, runs:list[IO[bytes]]) -> Iterator[tuple]:
+        # Equal rows come from the earliest run first, which keeps the sort stable:
+        try: yield from heapq.merge(*map(iterSpilledRows, runs), key = self.sortKey, reverse = self.isReversed)
+        finally:
+            for run in runs: run.close()
+
+class HashAggregateOp(Operator):
+    """
+    Groups the rows on the values of the key columns, as their domains compare them, and computes the aggregates of
+    each group in a single pass over the rows. Once there are too many groups for the memory budget, the rows of any
+    new group are spilled to partitions on disk by the hash of their key instead, and each partition is aggregated
+    on its own afterwards, as all the rows of a group end up in the same one.
+    """
+    MEMORY_BUDGET  = 64 << 20 # bytes
+    PARTITIONS_AMT = 16
+    def __init__(self, child:Operator, keyColIds:list[int], accumulators:list[Accumulator], memoryBudget :Optional[int] = None) -> None:
+        """ The rows are made of the key columns followed by the results of the accumulators """
+        resultsSchema = Schema()
+        for accumulator in accumulators: resultsSchema.addColumn(accumulator.domain)
+
+        super().__init__(Schema.merge(child.schema.project(keyColIds), resultsSchema))
+        self.child, self.keyColIds, self.accumulators = child, keyColIds, accumulators
+        self.memoryBudget = HashAggregateOp.MEMORY_BUDGET if memoryBudget is None else memoryBudget
+
+    def __iter__(self) -> Iterator[tuple]:
+        # Without keys there's a single group, which exists even when there are no rows:
+        if not self.keyColIds: return self.iterWithEmptyGroup()
+
+        return self.aggregate(self.child)
+
+    def iterWithEmptyGroup(self) -> Iterator[tuple]:
+        isEmpty = True
+        for row in self.aggregate(self.child):
+            isEmpty = False
+            yield row
+
+        if isEmpty: yield tuple([ accumulator.getEmptyResult() for accumulator in self.accumulators ])
+
+    def makeKeyGetter(self) -> Callable[[tuple], Hashable]:
+        if not self.keyColIds: return lambda _ : ()
+
+        domains = [ self.child.schema.domains[colId] for colId in self.keyColIds ]
+        if all(domain.comparesPlainly() for domain in domains): return itemgetter(*self.keyColIds)
+
+        keys = [ key for key, _ in makeSortKeys([ (colId, domain, False) for colId, domain in zip(self.keyColIds, domains) ]) ]
+        return keys[0] if len(keys) == 1 else lambda row : tuple([ key(row) for key in keys ])
+
+    def aggregate(self, rows:Iterable[tuple], depth = 0) -> Iterator[tuple]:
+        """ depth is how many times the rows were already partitioned, so that each time they are partitioned differently """
+        getKey, accumulators = self.makeKeyGetter(), list(enumerate(self.accumulators, 1))
+        groups     :dict[Hashable, list] = {} # the first row of each group followed by the states of its accumulators
+        partitions :list[list[tuple]]    = [ [] for _ in range(HashAggregateOp.PARTITIONS_AMT) ] # rows yet to be spilled
+        files      :list[Optional[IO[bytes]]] = [None] * HashAggregateOp.PARTITIONS_AMT
+        maxGroupsAmt = None
+        try:
+            for row in rows:
+                if (group := groups.get(key := getKey(row))) is not None:
+                    for stateId, accumulator in accumulators: group[stateId] = accumulator.update(group[stateId], row[accumulator.colId])
+
+                elif len(groups) != maxGroupsAmt:
+                    groups[key] = [row, *[ accumulator.start(row[accumulator.colId]) for _, accumulator in accumulators ]]
+                    if maxGroupsAmt is None: maxGroupsAmt = self.getMaxGroupsAmount(key, groups[key])
+
+                else:
+                    (partition := partitions[partitionId := hash((depth, key)) % HashAggregateOp.PARTITIONS_AMT]).append(row)
+                    if len(partition) == Table.ROWS_BATCH_SIZE:
+                        files[partitionId] = spillRows(partition, files[partitionId])
+                        partition.clear()
+
+            makeKey = makeRowProjector(self.keyColIds) if self.keyColIds else lambda _ : ()
+            for row, *states in groups.values():
+                yield makeKey(row) + tuple([ accumulator.finish(state) for (_, accumulator), state in zip(accumulators, states) ])
+
+            groups.clear()
+            for partition, file in zip(partitions, files):
+                if partition or file: yield from self.aggregate(iterSpilledRows(spillRows(partition, file)), depth + 1)
+
+        finally:
+            for file in files:
+                if file: file.close()
+
+    def getMaxGroupsAmount(self, key:Hashable, group:list) -> int:
+        """ Estimated from the size of the first group """
+        groupSize = getsizeof(group) + getsizeof(key) + sum(map(getsizeof, group)) + sum(map(getsizeof, group[0])) + 100 # for the dict
+        return max(1, self.memoryBudget // groupSize)
+
+class JoinOp(Operator):
+    """
+    Streams the left rows and pairs each of them with the right rows it matches, so only the right side needs to be
+    materialized. The output comes in the same order as the filtered cartesian product. This base version matches
+    every right row, i.e. it computes the cartesian product.
+    """
+    def __init__(self, left:Operator, right:Operator) -> None:
+        super().__init__(Schema.merge(left.schema, right.schema))
+        self.left, self.right = left, right
+
+    def makeMatcher(self, rightRows:list[tuple]) -> Callable[[tuple], Iterable[tuple]]:
+        """ Returns the function finding the right rows that match a left row, in order """
+        return lambda _ : rightRows
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Only what's needed to match rows is sent to worker processes, the operators below stay behind:
+        return self.__dict__ | { "left" : None, "right" : None }
+
+    def __iter__(self) -> Iterator[tuple]:
+        getMatches = self.makeMatcher(list(self.right))
+        for leftRow in self.left: yield from map(leftRow.__add__, getMatches(leftRow))
+
+class HashJoinOp(JoinOp):
+    """ Joins on the equality of a left column and a right column, the hash table being built on the smaller side """
+    def __init__(self, left:Operator, right:Operator, leftColId:int, rightColId:int, domain:SQLDomain) -> None:
+        super().__init__(left, right)
+        self.leftColId, self.rightColId, self.domain = leftColId, rightColId, domain
+
+    def makeMatcher(self, rightRows:list[tuple]) -> Callable[[tuple], Iterable[tuple]]:
+        key, leftColId, rightColId = self.domain.toComparable, self.leftColId, self.rightColId
+        buckets :dict[Hashable, list[tuple]] = {}
+        for rightRow in rightRows: buckets.setdefault(key(rightRow[rightColId]), []).append(rightRow)
+
+        return lambda leftRow : buckets.get(key(leftRow[leftColId]), ())
+
+    def __iter__(self) -> Iterator[tuple]:
+        # Only as many left rows as there are right ones are read to find out which side is the smaller one:
+        rightRows, leftRows = list(self.right), iter(self.left)
+        if len(firstLeftRows := list(islice(leftRows, len(rightRows)))) == len(rightRows):
+            getMatches = self.makeMatcher(rightRows)
+            for leftRow in chain(firstLeftRows, leftRows): yield from map(leftRow.__add__, getMatches(leftRow))
+            return
+
+        # The left side is smaller, so it's the one that's hashed and the right side probes it. The matches are
+        # gathered by left row first, so that the rows still come out in the same order:
+        key, leftColId, rightColId = self.domain.toComparable, self.leftColId, self.rightColId
+        buckets :dict[Hashable, list[int]] = {}
+        for leftRowId, leftRow in enumerate(firstLeftRows): buckets.setdefault(key(leftRow[leftColId]), []).append(leftRowId)
+
+        matches :list[list[tuple]] = [ [] for _ in firstLeftRows ]
+        for rightRow in rightRows:
+            for leftRowId in buckets.get(key(rightRow[rightColId]), ()): matches[leftRowId].append(rightRow)
+
+        for leftRow, rightMatches in zip(firstLeftRows, matches): yield from map(leftRow.__add__, rightMatches)
+
+class ThetaJoinOp(JoinOp):
+    """ Joins on any other comparison between a left column and a right column """
+    def __init__(self, left:Operator, right:Operator, leftColId:int, rightColId:int, domain:SQLDomain, compare:Callable[[Any, Any], bool]) -> None:
+        super().__init__(left, right)
+        self.leftColId, self.rightColId, self.domain, self.compare = leftColId, rightColId, domain, compare
+
+    def makeMatcher(self, rightRows:list[tuple]) -> Callable[[tuple], Iterable[tuple]]:
+        # Each left row is compared with the whole right column in one go:
+        key, leftColId, compare = self.domain.toComparable, self.leftColId, self.compare
+        rightKeys = [ key(rightRow[self.rightColId]) for rightRow in rightRows ]
+        return lambda leftRow : compress(rightRows, map(compare, repeat(key(leftRow[leftColId])), rightKeys))
+
+class FilteredJoinOp(JoinOp):
+    """ Joins on a condition compiled on the joined schema """
+    def __init__(self, left:Operator, right:Operator, cond:Condition, evaluator:RowEvaluator[bool]) -> None:
+        super().__init__(left, right)
+        self.cond, self.evaluator = cond, evaluator
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Compiled conditions can't be pickled, so they are compiled again by the worker processes:
+        return super().__getstate__() | { "evaluator" : None }
+
+    def __setstate__(self, state:dict[str, Any]) -> None:
+        self.__dict__ = state
+        self.evaluator = self.cond.compile(self.schema).unwrap()
+
+    def makeMatcher(self, rightRows:list[tuple]) -> Callable[[tuple], Iterable[tuple]]:
+        evaluator = self.evaluator
+        return lambda leftRow : [ rightRow for rightRow in rightRows if evaluator(leftRow + rightRow) ]
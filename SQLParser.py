@@ -2,6 +2,7 @@ from datetime     import datetime
 from Utils        import CustomErr, formatIntoDetails
 from typing       import *
 from SQLQuery     import Query
+from SQLAggregate import Aggregate
 from Predicate    import *
 from SQLTokenizer import *
 
@@ -32,9 +33,10 @@ class SQLParser:
         self.cursor :int         = 0
         self.tokens :list[Token] = []
         self.parsedQuery         = Query()
+        self.positionalParamsAmt = 0
 
-    def parse(self, programText:str) -> Res[None, Exception]:
-        print("Parsing query..")
+    def parse(self, programText:str, *, isVerbose = True) -> Res[None, Exception]:
+        if isVerbose: print("Parsing query..")
         self.reset()
 
         if (tokenizationRes := self.tokenize(programText)).isErr(): return tokenizationRes
@@ -51,26 +53,38 @@ class SQLParser:
         if (wherePred := self.parseWhereClause()).isErr(): return wherePred
         if wherePred  := wherePred.unwrap(): self.parsedQuery.setWherePredicate(wherePred)
 
+        # Then there can be a GROUP BY clause:
+        if (groupBy := self.parseGroupByClause()).isErr(): return groupBy
+        self.parsedQuery.setGroupBy(groupBy.unwrap())
+
+        # Then there can be an ORDER BY clause:
+        if (orderBy := self.parseOrderByClause()).isErr(): return orderBy
+        self.parsedQuery.setOrderBy(orderBy.unwrap())
+
+        # Then there can be a LIMIT clause:
+        if (limit := self.parseLimitClause()).isErr(): return limit
+        if limit  := limit.unwrap(): self.parsedQuery.setLimit(*limit)
+
         # There can be an optional ";" at the end:
         if (queryEnd := self.getNextToken(Token.TokenType.END, mustExist = False)).isErr(): return queryEnd
 
         # Then we must be done:
         if not self.isStreamFinished(): return Res.Err(Exception("Unexpected trailing content after end of query"))
 
-        print("Query parsed successfully.")
+        if isVerbose: print("Query parsed successfully.")
         return Res.Ok(None)
     
-    def parseSelectClause(self) -> Res[list[str], Exception]:
+    def parseSelectClause(self) -> Res[list[str|Aggregate], Exception]:
         # "SELECT"
         if (selectKw := self.getKeyword(SQLTokenizer.Keyword.SELECT, "at the start of query")).isErr():
             return selectKw
 
-        # Attr
-        if (firstSelectedColumn := self.parseAttribute()).isErr(): return firstSelectedColumn
-        selectedColumns = [firstSelectedColumn.unwrap().name]
+        # SelectItem
+        if (firstSelectedColumn := self.parseSelectItem()).isErr(): return firstSelectedColumn
+        selectedColumns = [firstSelectedColumn.unwrap()]
         #TODO: Here it might make sense to keep the whole attribute instances
 
-        # ("," Attr)*
+        # ("," SelectItem)*
         # Here it's not the SELECT clause's responsability to demand that something must exist after the first
         # attribute, the reason why I don't set mustExist = False here is that the token is not consumed: we
         # are just checking wether there's a comma there. If not (nothing = not a comma) we are done with SELECT.
@@ -79,14 +93,36 @@ class SQLParser:
                 return Res.Err(Exception("Cannot select all (*) and also other attributes."))
 
             self.advance() # Now if it is there we must consume it.
-            if (selectedColumn := self.parseAttribute()).isErr(): return selectedColumn
+            if (selectedColumn := self.parseSelectItem()).isErr(): return selectedColumn
             
-            selectedColumns.append(selectedColumn.unwrap().name)
+            selectedColumns.append(selectedColumn.unwrap())
 
         return Res.Err(
             Exception("Cannot select all (*) and also other attributes."
         )) if len(selectedColumns) > 1 and (selectedColumns[-1] == MathOp.MUL.value) else Res.Ok(selectedColumns)
     
+    def parseSelectItem(self, *, canBeAll = True) -> Res[str|Aggregate, Exception]:
+        # Aggregate | Attr
+        if self.isNextAggregate(): return self.parseAggregate()
+        return self.parseAttribute(canBeAll = canBeAll).map(lambda attr : attr.name)
+
+    def isNextAggregate(self) -> bool:
+        """ Function names aren't keywords, so that columns can still be named after them: it's the "(" that tells them apart """
+        return (token := self.getNextToken(Token.TokenType.IDENT, isConsumed = False, mustExist = False)).isOk() and (
+            token.unwrap() is not None and token.unwrap().value.upper() in Aggregate.Func.__members__) and (
+            self.cursor + 1 < len(self.tokens) and self.tokens[self.cursor + 1].type == Token.TokenType.LPAREN)
+
+    def parseAggregate(self) -> Res[Aggregate, Exception]:
+        # AggregateFunc "(" ("*" | Attr) ")", only COUNT accepts "*"
+        func = Aggregate.Func(self.getNextToken().unwrap().value.upper())
+        self.advance() # the "(" was already checked
+
+        if (attr := self.parseAttribute(canBeAll = func == Aggregate.Func.COUNT)).isErr(): return attr
+        if (closingParentheses := self.getNextToken(Token.TokenType.RPAREN)).isErr(): return closingParentheses
+
+        attr = attr.unwrap()
+        return Res.Ok(Aggregate(func, None if attr.name == MathOp.MUL.value else attr))
+
     def parseFromClause(self) -> Res[list[str], KeywordErr|UnexpectedEOIErr|TokenTypeErr]:
         # "FROM"
         if (fromKw := self.getKeyword(SQLTokenizer.Keyword.FROM, "after SELECT clause")).isErr():
@@ -106,40 +142,116 @@ class SQLParser:
 
         return Res.Ok(tables)
 
-    def parseWhereClause(self) -> Res[Optional[Predicate], Exception]:
+    def parseWhereClause(self) -> Res[Optional[Condition], Exception]:
         # WHERE
-        # Here if the next token is nothing or not a keyword it's no longer our responsibility:
+        # Here if the next token is nothing, not a keyword or the keyword of a later clause it's no longer our responsibility:
+        if self.isNextKeyword(SQLTokenizer.Keyword.GROUP, SQLTokenizer.Keyword.ORDER, SQLTokenizer.Keyword.LIMIT): return Res.Ok(None)
         if (whereKw := self.getKeyword(SQLTokenizer.Keyword.WHERE, "after FROM clause", isOpt = True)).isErr():
             return whereKw if isinstance(whereKw.err, self.KeywordErr) else Res.Ok(None)
 
-        # Predicate : Attr CompareOp Value
-        # Attr
-        if (attr := self.parseAttribute(canBeAll = False)).isErr(): return attr
+        # Predicate
+        return self.parsePredicate()
 
-        # CompareOp
-        if (op := self.parseCompareOp()).isErr(): return op
+    def parseGroupByClause(self) -> Res[list[str], Exception]:
+        # "GROUP" "BY" Attr ("," Attr)*
+        if not self.isNextKeyword(SQLTokenizer.Keyword.GROUP): return Res.Ok([])
+        self.advance()
 
-        # Value
-        if (value := self.parseValue()).isErr(): return value
+        if (byKw := self.getKeyword(SQLTokenizer.Keyword.BY, "after GROUP")).isErr(): return byKw
 
-        return Res.Ok(Predicate(attr.unwrap(), op.unwrap(), value.unwrap()))
+        if (firstAttr := self.parseAttribute(canBeAll = False)).isErr(): return firstAttr
 
-    def parsePredicate(self) -> Res[Predicate, Exception]:
-        # ComparisonExpr (LogicalOp ComparisonExpr)* | "(" Predicate ")"
-        # ComparisonExpr
-        if (firstComp := self.parseCompareExpr()).isErr(): return firstComp
+        # ("," Attr)*
+        columnNames = [firstAttr.unwrap().name]
+        while self.getNextToken(Token.TokenType.COMMA, isConsumed = False).isOk():
+            self.advance()
+            if (attr := self.parseAttribute(canBeAll = False)).isErr(): return attr
 
-        # (LogicalOp ComparisonExpr)*
-        compExprs = [firstComp.unwrap()]
-        while (op := self.parseLogicalOp(isConsumed = False)).isOk():
-            pass #TODO: implement a base class for the common tree-like nature of MathExpr and Predicate
-        
-        # "(" Predicate ")"
+            columnNames.append(attr.unwrap().name)
+
+        return Res.Ok(columnNames)
+
+    def parseOrderByClause(self) -> Res[list[tuple[str|Aggregate, bool]], Exception]:
+        # "ORDER" "BY" SortKey ("," SortKey)*
+        if not self.isNextKeyword(SQLTokenizer.Keyword.ORDER): return Res.Ok([])
+        self.advance()
+
+        if (byKw := self.getKeyword(SQLTokenizer.Keyword.BY, "after ORDER")).isErr(): return byKw
+
+        if (firstSortKey := self.parseSortKey()).isErr(): return firstSortKey
+
+        # ("," SortKey)*
+        sortKeys = [firstSortKey.unwrap()]
+        while self.getNextToken(Token.TokenType.COMMA, isConsumed = False).isOk():
+            self.advance()
+            if (sortKey := self.parseSortKey()).isErr(): return sortKey
+
+            sortKeys.append(sortKey.unwrap())
 
-    def parseCompareExpr(self) -> Res[CompareExpr, Exception]:
-        # MathExpr CompareOp MathExpr
+        return Res.Ok(sortKeys)
+
+    def parseSortKey(self) -> Res[tuple[str|Aggregate, bool], Exception]:
+        # (Attr | Aggregate) ("ASC" | "DESC")?
+        if (sortKey := self.parseSelectItem(canBeAll = False)).isErr(): return sortKey
+
+        isDescending = self.isNextKeyword(SQLTokenizer.Keyword.DESC)
+        if isDescending or self.isNextKeyword(SQLTokenizer.Keyword.ASC): self.advance()
+        return Res.Ok((sortKey.unwrap(), isDescending))
+
+    def parseLimitClause(self) -> Res[Optional[tuple[int, int]], Exception]:
+        # "LIMIT" INT ("OFFSET" INT)?
+        if not self.isNextKeyword(SQLTokenizer.Keyword.LIMIT): return Res.Ok(None)
+        self.advance()
+
+        if (limit := self.parseCount("LIMIT")).isErr(): return limit
+        if not self.isNextKeyword(SQLTokenizer.Keyword.OFFSET): return Res.Ok((limit.unwrap(), 0))
+        self.advance()
+
+        return self.parseCount("OFFSET").map(lambda offset : (limit.unwrap(), offset))
+
+    def parseCount(self, clauseName:str) -> Res[int, Exception]:
+        # INT, which can't be negative
+        if (token := self.getNextToken(Token.TokenType.INT)).isErr(): return token
+        if (count := int(token.unwrap().value)) < 0: return Res.Err(Exception(f"{clauseName} cannot be negative, got {count}"))
+        return Res.Ok(count)
+
+    def parsePredicate(self) -> Res[Condition, Exception]:
+        # Conjunction ("OR" Conjunction)*
+        return self.parseLogicExpr(LogicOp.OR, self.parseConjunction)
+
+    def parseConjunction(self) -> Res[Condition, Exception]:
+        # Factor ("AND" Factor)*
+        return self.parseLogicExpr(LogicOp.AND, self.parseFactor)
+
+    def parseLogicExpr(self, op:LogicOp, parseOperand:Callable[[], Res[Condition, Exception]]) -> Res[Condition, Exception]:
+        """ AND binds tighter than OR, so each of them has its own level, like math operators do """
+        if (firstCond := parseOperand()).isErr(): return firstCond
+
+        conds = [firstCond.unwrap()]
+        while (nextOp := self.parseLogicalOp(isConsumed = False)).isOk() and nextOp.unwrap() == op:
+            self.advance()
+            if (cond := parseOperand()).isErr(): return cond
+
+            conds.append(cond.unwrap())
+
+        return Res.Ok(makeLogicExpr(op, conds))
+
+    def parseFactor(self) -> Res[Condition, Exception]:
+        # ComparisonExpr | "(" Predicate ")"
+        # A "(" can open either a predicate or a math expression, e.g. "(a + b) > c", so the comparison is tried first:
+        start, isParenthesized = self.cursor, self.getNextToken(Token.TokenType.LPAREN, isConsumed = False).isOk()
+        if (compExpr := self.parseCompareExpr()).isOk() or not isParenthesized: return compExpr
+
+        self.cursor = start + 1
+        if (pred := self.parsePredicate()).isErr(): return pred
+        if (closingParentheses := self.getNextToken(Token.TokenType.RPAREN)).isErr(): return closingParentheses
+        return pred
+
+    def parseCompareExpr(self) -> Res[Condition, Exception]:
+        # MathExpr CompareOp MathExpr | MathExpr "BETWEEN" MathExpr "AND" MathExpr
         # MathExpr
         if (lhs := self.parseMathExpr()).isErr(): return lhs
+        if self.isNextKeyword(SQLTokenizer.Keyword.BETWEEN): return self.parseBetweenExpr(lhs.unwrap())
 
         # CompareOp
         if (op := self.parseCompareOp()).isErr(): return op
@@ -147,7 +259,22 @@ class SQLParser:
         # MathExpr
         if (rhs := self.parseMathExpr()).isErr(): return rhs
 
-        return Res.Ok(CompareExpr(lhs, op, rhs))
+        return Res.Ok(makeCondition(CompareExpr(lhs.unwrap(), op.unwrap(), rhs.unwrap())))
+
+    def parseBetweenExpr(self, operand:Operand) -> Res[Condition, Exception]:
+        # "BETWEEN" MathExpr "AND" MathExpr, the bounds being included
+        self.advance()
+        if (lowerBound := self.parseMathExpr()).isErr(): return lowerBound
+
+        if (andOp := self.parseLogicalOp()).isErr(): return andOp
+        if andOp.unwrap() != LogicOp.AND: return Res.Err(Exception("Expected AND between the bounds of BETWEEN"))
+
+        if (upperBound := self.parseMathExpr()).isErr(): return upperBound
+
+        # Splitting it in two comparisons lets each of them use the zone maps or an index:
+        return Res.Ok(makeLogicExpr(LogicOp.AND, [
+            makeCondition(CompareExpr(operand, CompareOp.GREATER_EQUALS, lowerBound.unwrap())),
+            makeCondition(CompareExpr(operand, CompareOp.LESS_EQUALS,    upperBound.unwrap())) ]))
 
     def parseMathExpr(self, priority = 0) -> Res[MathExpr, Exception]:
         # Operand (MathOp Operand)*
@@ -167,7 +294,9 @@ class SQLParser:
         return Res.Ok(lhs)
 
     def parseOperand(self) -> Res[Operand, Exception]:
-        # Literal | Attr | "(" MathExpr ")"
+        # Literal | Attr | Param | "(" MathExpr ")"
+        if self.getNextToken(Token.TokenType.PARAM, isConsumed = False).isOk(): return self.parseParameter()
+
         if self.getNextToken(Token.TokenType.LPAREN, isConsumed = False).isOk():
             self.advance()
             if (operand := self.parseMathExpr()).isErr(): return operand
@@ -181,6 +310,14 @@ class SQLParser:
         if isinstance(operand, Attribute): self.advance()
         return Res.Ok(operand)
 
+    def parseParameter(self) -> Res[Parameter, UnexpectedEOIErr|TokenTypeErr]:
+        # "?" | ":" IDENT
+        if (token := self.getNextToken(Token.TokenType.PARAM)).isErr(): return token
+        if (name := token.unwrap().value[1:]): return Res.Ok(Parameter(name))
+
+        self.positionalParamsAmt += 1
+        return Res.Ok(Parameter(str(self.positionalParamsAmt - 1)))
+
     def parseValue(self) -> Res[Literal, UnexpectedEOIErr|TokenTypeErr|ValueError]:
         if (token := self.getNextToken([Token.TokenType.INT, Token.TokenType.STR, Token.TokenType.DATE])).isErr():
             return token
@@ -205,9 +342,9 @@ class SQLParser:
         # "==" | "!=" | "<>" | "<" | ">" | ">=" | "<="
         return self.getNextToken(Token.TokenType.COMPARE_OP).map(lambda token : CompareOp(token.value))
 
-    def parseLogicalOp(self) -> Res[CompareOp, UnexpectedEOIErr|TokenTypeErr]:
+    def parseLogicalOp(self, *, isConsumed = True) -> Res[LogicOp, UnexpectedEOIErr|TokenTypeErr]:
         # "AND" | "OR"
-        return self.getNextToken(Token.TokenType.LOGIC_OP).map(lambda token : LogicOp(token.value))
+        return self.getNextToken(Token.TokenType.LOGIC_OP, isConsumed = isConsumed).map(lambda token : LogicOp(token.value.lower()))
 
     def parseAttribute(self, *, canBeAll = True, isConsumed = True) -> Res[Attribute, Exception]:
         # "*" | IDENT
@@ -233,6 +370,11 @@ class SQLParser:
         keyword = SQLTokenizer.Keyword(keyword.unwrap().value.upper())
         return Res.Ok(None) if keyword == expKeyword else Res.Err(self.KeywordErr(expKeyword, keyword, detailsErrMsg))
 
+    def isNextKeyword(self, *keywords:SQLTokenizer.Keyword) -> bool:
+        """ Doesn't consume the token """
+        return (token := self.getNextToken(Token.TokenType.KEYWORD, isConsumed = False, mustExist = False)).isOk() and (
+            token.unwrap() is not None and token.unwrap().value.upper() in keywords)
+
     def isStreamFinished(self) -> bool: return self.cursor >= len(self.tokens)
     
     def advance(self, amount = 1) -> None:
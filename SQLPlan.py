@@ -0,0 +1,201 @@
+from Utils        import Res, CustomErr
+from typing       import *
+from bisect       import bisect_right
+from functools    import reduce
+from Predicate    import Predicate, Condition, RowEvaluator, MathOp, rankConditions
+from SQLSchema    import Schema
+from SQLTable     import Table
+from SQLAggregate import Aggregate
+from SQLOperators import *
+from SQLParallel  import ParallelScanner, ParallelJoinOp
+
+class TableScan:
+    """ One of the tables in the FROM clause, along with the work that can be done on it before it's joined """
+    def __init__(self, tableName:str, columnsAmt:int) -> None:
+        self.tableName  = tableName
+        self.columnsAmt = columnsAmt
+        self.filters   :list[Condition] = [] # only involve this table
+        self.joinConds :list[Condition] = [] # involve this table and some of the ones before it in FROM
+        self.columnIds :set[int]        = set()
+        self.evaluators :dict[int, RowEvaluator[bool]] = {} # the compiled conditions, by id
+
+    def compile(self, table:Table, joinedSchema:Optional[Schema]) -> Res[Schema, Exception]:
+        """
+        Compiles the conditions against the schemas they will actually be evaluated on, joinedSchema being the one
+        of the tables before this one once joined. Returns the schema of the join including this table.
+        """
+        # Conditions are checked in turn, in the order they're expected to take the least work in. Nothing is known
+        # about the values of joined rows, so join conditions are only ranked on their cost:
+        self.filters   = table.orderConditions(self.filters)
+        self.joinConds = rankConditions(self.joinConds, lambda _ : None)
+
+        schema       = table.schema if self.isProjectionless() else table.schema.project(self.getProjection())
+        joinedSchema = Schema.merge(joinedSchema, schema) if joinedSchema else schema
+        condsSchemas = [ table.schema ] * len(self.filters) + [ joinedSchema ] * len(self.joinConds)
+        for cond, condSchema in zip(self.filters + self.joinConds, condsSchemas):
+            if (evaluator := cond.compile(condSchema)).isErr(): return evaluator
+            self.evaluators[id(cond)] = evaluator.unwrap()
+
+        return Res.Ok(joinedSchema)
+
+    def isProjectionless(self) -> bool: return len(self.columnIds) == self.columnsAmt
+
+    def getProjection(self) -> list[int]:
+        # A table must still contribute its rows to the product even when none of its columns are needed:
+        return sorted(self.columnIds) or [0]
+
+    def open(self, table:Table, scanner :Optional[ParallelScanner] = None) -> Operator:
+        colIds = list(range(self.columnsAmt)) if self.isProjectionless() else self.getProjection()
+        if scanner and scanner.isWorthIt(table, self.filters):
+            return ScanOp(table, colIds, lambda : scanner.iterFoundRows(table, self.filters).unwrap())
+
+        # The first predicate, i.e. the most selective one, finds the candidate rows a whole column at a time, the
+        # rest are checked row by row:
+        pred = next(( cond for cond in self.filters if isinstance(cond, Predicate) ), None)
+        return ScanOp(table, colIds,
+            pred and (lambda : table.iterFoundRows(pred).unwrap()),
+            [ self.evaluators[id(cond)] for cond in self.filters if cond is not pred ])
+        # ^^^ unwrapping is safe as the conditions were already compiled on the same schema
+
+    def join(self, left:Operator, right:Operator, scanner :Optional[ParallelScanner] = None) -> Operator:
+        # Equalities are favored as they allow a hash join:
+        joinCond, *otherConds = sorted(self.joinConds,
+            key = lambda cond : not (isinstance(cond, Predicate) and cond.isEquality())) or [None]
+
+        joinOp = self.makeJoinOp(left, right, joinCond)
+        if scanner: joinOp = ParallelJoinOp(joinOp, scanner)
+        for cond in otherConds: joinOp = FilterOp(joinOp, self.evaluators[id(cond)])
+        return joinOp
+
+    def makeJoinOp(self, left:Operator, right:Operator, cond:Optional[Condition]) -> JoinOp:
+        if cond is None:                    return JoinOp(left, right)
+        if not isinstance(cond, Predicate): return FilteredJoinOp(left, right, cond, self.evaluators[id(cond)])
+
+        # Join predicates always compare a left column with a right one:
+        colId, domain, otherColId = cond.resolve(Schema.merge(left.schema, right.schema)).unwrap()
+        leftWidth = left.schema.getColumnsAmount()
+        leftColId, rightColId = sorted((colId, otherColId))
+        if cond.isEquality(): return HashJoinOp(left, right, leftColId, rightColId - leftWidth, domain)
+
+        op = cond.op if colId < leftWidth else cond.op.getMirrored()
+        return ThetaJoinOp(left, right, leftColId, rightColId - leftWidth, domain, op.getOperator())
+
+class QueryPlan:
+    class GroupingErr(CustomErr):
+        MSG = "Invalid grouping"
+        def __init__(self, columnName:str) -> None:
+            super().__init__(f"column \"{columnName}\" must either appear in the GROUP BY clause or be used in an aggregate")
+
+    def __init__(self, scans:list[TableScan], columnNames:list[str], orderBy:list[tuple[str|Aggregate, bool]], limit:Optional[int], offset:int,
+                 groupBy:list[str], aggregates:list[Aggregate]) -> None:
+        """ Private constructor """
+        self.scans, self.columnNames  = scans, columnNames
+        self.groupBy, self.aggregates = groupBy, aggregates
+        self.orderBy                  = orderBy
+        self.limit, self.offset       = limit, offset
+
+    def build(tableNames:list[str], tables:list[Table], cond:Optional[Condition], columnNames:list[str],
+              orderBy :list[tuple[str|Aggregate, bool]] = [], limit :Optional[int] = None, offset = 0,
+              groupBy :list[str] = [], aggregates :list[Aggregate] = []) -> Res[Self, Exception]:
+        """
+        Static, every name is resolved against the schema of the whole FROM product so that errors are the same
+        as if the product was actually built, then each condition is moved as close to its tables as possible.
+        """
+        scans       = [ TableScan(name, table.schema.getColumnsAmount()) for name, table in zip(tableNames, tables) ]
+        schema      = reduce(Schema.merge, [ table.schema for table in tables ])
+        tableStarts = [0]
+        for scan in scans[:-1]: tableStarts.append(tableStarts[-1] + scan.columnsAmt)
+
+        def useColumn(colId:int) -> int:
+            """ Returns the position in FROM of the table the column belongs to """
+            tableId = bisect_right(tableStarts, colId) - 1
+            scans[tableId].columnIds.add(colId - tableStarts[tableId])
+            return tableId
+
+        # Each of the conditions that must all hold is moved on its own, e.g. a join on an equality stays a hash join:
+        for cond in cond.getConjuncts() if cond else []:
+            if (evaluator := cond.compile(schema)).isErr(): return evaluator
+
+            tableIds = { useColumn(schema.getIdAndDomain(attr.name).unwrap()[0]) for attr in cond.getAttributes() }
+            lastScan = scans[max(tableIds, default = 0)]
+            (lastScan.filters if len(tableIds) <= 1 else lastScan.joinConds).append(cond)
+
+        if isGrouped := bool(groupBy or aggregates):
+            if (grouping := QueryPlan.resolveGrouping(schema, columnNames, orderBy, groupBy, aggregates)).isErr(): return grouping
+            for colId in grouping.unwrap(): useColumn(colId)
+
+        # Projecting only pays off when it shrinks the rows going through a join:
+        elif MathOp.MUL.value in columnNames or len(scans) == 1:
+            for scan in scans: scan.columnIds = set(range(scan.columnsAmt))
+
+        else:
+            for columnName in columnNames:
+                if (column := schema.getIdAndDomain(columnName)).isErr(): return column
+                useColumn(column.unwrap()[0])
+
+        # The sort keys don't have to be selected, once grouped they were already resolved along with the selected columns:
+        for columnName, _ in [] if isGrouped else orderBy:
+            if (column := schema.getIdAndDomain(columnName)).isErr(): return column
+            useColumn(column.unwrap()[0])
+
+        joinedSchema = None
+        for scan, table in zip(scans, tables):
+            if (joinedSchema := scan.compile(table, joinedSchema)).isErr(): return joinedSchema
+            joinedSchema = joinedSchema.unwrap()
+
+        return Res.Ok(QueryPlan(scans, columnNames, orderBy, limit, offset, groupBy, aggregates))
+
+    def resolveGrouping(schema:Schema, columnNames:list[str], orderBy:list[tuple[str|Aggregate, bool]], groupBy:list[str],
+                        aggregates:list[Aggregate]) -> Res[set[int], Exception]:
+        """
+        Static, checks that the selected columns and the sort keys can be computed once the rows are grouped, i.e.
+        that they are aggregates or columns the rows are grouped on. Returns the columns that grouping needs.
+        """
+        groupColIds :set[int] = set()
+        for columnName in groupBy:
+            if (column := schema.getIdAndDomain(columnName)).isErr(): return column
+            groupColIds.add(column.unwrap()[0])
+
+        colIds = set(groupColIds)
+        for aggregate in aggregates:
+            if (accumulator := aggregate.compile(schema)).isErr(): return accumulator
+            colIds.update(schema.getIdAndDomain(attr.name).unwrap()[0] for attr in aggregate.getAttributes())
+
+        aggregateNames = { aggregate.getName().lower() for aggregate in aggregates }
+        for columnName in columnNames + [ str(sortKey) for sortKey, _ in orderBy ]:
+            if columnName.lower() in aggregateNames: continue
+            if columnName == MathOp.MUL.value: return Res.Err(QueryPlan.GroupingErr(columnName))
+
+            if (column := schema.getIdAndDomain(columnName)).isErr(): return column
+            if column.unwrap()[0] not in groupColIds: return Res.Err(QueryPlan.GroupingErr(columnName))
+
+        return Res.Ok(colIds)
+
+    def run(self, tables:list[Table], scanner :Optional[ParallelScanner] = None) -> Res[Table, Exception]:
+        """ The tables must be the ones the plan was built for, scans and joins are run in parallel when given a scanner """
+        return Res.wrap(lambda : self.open(tables, scanner).materialize())
+
+    def open(self, tables:list[Table], scanner :Optional[ParallelScanner] = None) -> Operator:
+        """ Builds the operators executing the plan, nothing is computed until they are iterated over """
+        op = self.scans[0].open(tables[0], scanner)
+        for scan, table in zip(self.scans[1:], tables[1:]): op = scan.join(op, scan.open(table, scanner), scanner)
+
+        # The rows are aggregated as they come, the groups being the only thing kept in memory:
+        if self.groupBy or self.aggregates:
+            keyColIds = list(dict.fromkeys(op.schema.getIdAndDomain(columnName).unwrap()[0] for columnName in self.groupBy ))
+            op = HashAggregateOp(op, keyColIds, [ aggregate.compile(op.schema).unwrap() for aggregate in self.aggregates ])
+
+        # With a limit, only the rows up to the last kept one have to be sorted:
+        if self.orderBy: op = SortOp(op, makeSortKeys([ (*op.schema.getIdAndDomain(str(sortKey)).unwrap(), isDescending)
+            for sortKey, isDescending in self.orderBy ]), None if self.limit is None else self.offset + self.limit)
+
+        # The selected columns were already resolved while building the plan:
+        op = ProjectOp(op, *op.schema.select(self.columnNames).unwrap())
+
+        # Rows are pulled one at a time through all the operators, so nothing past the last kept row is ever computed:
+        return op if self.limit is None and not self.offset else LimitOp(op, self.limit, self.offset)
+
+    def __repr__(self) -> str:
+        return "\n".join([
+            f"Scan \"{scan.tableName}\" columns: {sorted(scan.columnIds)}, filters: {len(scan.filters)}, join conditions: {len(scan.joinConds)}"
+            for scan in self.scans ] + [ f"Group by {self.groupBy}, aggregates: {self.aggregates}" ] * bool(self.groupBy or self.aggregates))
@@ -1,45 +1,129 @@
-from Utils        import Res
+from Utils        import Res, CustomErr
 from typing       import *
+import weakref
+from datetime     import datetime
 from SQLTable     import Table, Schema
 from SQLDomain    import SQLDomain
-from Predicate    import Predicate
+from Predicate    import Condition, Parameter, Literal
+from SQLAggregate import Aggregate
+from SQLPlan      import QueryPlan
+from SQLParallel  import ParallelScanner
 from TableManager import TableManager
 
 class Query:
     def __init__(self) -> None:
-        self.wherePred   :Optional[Predicate] = None
+        self.wherePred   :Optional[Condition] = None
         self.tableNames  :list[str] = []
-        self.columnNames :list[str] = []
+        self.columns     :list[str|Aggregate] = [] # as selected
+        self.columnNames :list[str] = []           # of the columns of the result
+        self.groupBy     :list[str] = []
+        self.orderBy     :list[tuple[str|Aggregate, bool]] = [] # sort keys, and whether they sort in descending order
+        self.limit       :Optional[int] = None # rows, all of them when None
+        self.offset      :int           = 0
+        self.resetPlan()
     
-    def setColumnNames(self, *columnNames:str) -> None:
-        self.columnNames = list(columnNames)
+    def resetPlan(self) -> None:
+        self._plan          :Optional[QueryPlan]      = None
+        self._plannedTables :list[weakref.ref[Table]] = []
+
+    def setColumnNames(self, *columns:str|Aggregate) -> None:
+        """ Aggregates are selected as the columns named after them """
+        self.columns     = list(columns)
+        self.columnNames = list(map(str, columns))
+        self.resetPlan()
     
     def setTableNames(self, *tableNames:str) -> None:
         self.tableNames = list(tableNames)
+        self.resetPlan()
     
-    def setWherePredicate(self, predicate:Predicate) -> None:
+    def setWherePredicate(self, predicate:Condition) -> None:
         self.wherePred = predicate
+        self.resetPlan()
     
-    def run(self, tableManager:TableManager) -> Res[Table, Exception]:
-        return Res.Ok(tableManager
-        ).flatMap(self._runFromClause
-        ).flatMap(self._runWhereClause
-        ).flatMap(self._runSelectClause)
-
-    def _runFromClause(self, tableManager:TableManager) -> Res[Table, Exception]:
-        # vvv this DOES stop as soon as it fails because it's a map so it's evaluated lazily inside toOverallList
+    def setGroupBy(self, columnNames:list[str]) -> None:
+        self.groupBy = columnNames
+        self.resetPlan()
+
+    def setOrderBy(self, sortKeys:list[tuple[str|Aggregate, bool]]) -> None:
+        self.orderBy = sortKeys
+        self.resetPlan()
+
+    def setLimit(self, limit:Optional[int], offset = 0) -> None:
+        """ Only keeps limit rows (all of them when None) after skipping offset rows """
+        self.limit, self.offset = limit, offset
+        self.resetPlan()
+
+    def getAggregates(self) -> list[Aggregate]:
+        """ Those of the SELECT and ORDER BY clauses, each of them only once """
+        aggregates = [ column for column in self.columns if isinstance(column, Aggregate) ] + [
+            sortKey for sortKey, _ in self.orderBy if isinstance(sortKey, Aggregate) ]
+
+        return list({ aggregate.getName().lower() : aggregate for aggregate in aggregates }.values())
+
+    def isGrouped(self) -> bool:
+        """ Whether the result has a row per group of rows rather than a row per row """
+        return bool(self.groupBy or self.getAggregates())
+
+    def getParameters(self) -> list[Parameter]:
+        return self.wherePred.getParameters() if self.wherePred else []
+
+    def bind(self, values:dict[str, Literal]) -> Self:
+        """ Returns a copy of the query with the parameters replaced by their values """
+        boundQuery = Query()
+        boundQuery.setColumnNames(*self.columns)
+        boundQuery.setTableNames(*self.tableNames)
+        if self.wherePred: boundQuery.setWherePredicate(self.wherePred.bind(values))
+        boundQuery.setGroupBy(self.groupBy)
+        boundQuery.setOrderBy(self.orderBy)
+        boundQuery.setLimit(self.limit, self.offset)
+        return boundQuery
+
+    def run(self, tableManager:TableManager, scanner :Optional[ParallelScanner] = None) -> Res[Table, Exception]:
         if (tables := tableManager.getTables(self.tableNames)).isErr(): return tables
         
-        tables :list[Table] = tables.unwrap()
-        firstTable = tables[0]
-        for table in tables[1:]:
-            if (joinRes := firstTable.join(table, None)).isErr(): return joinRes
-            firstTable   = joinRes.unwrap()
-        
-        return Res.Ok(firstTable)
+        tables = tables.unwrap()
+        return self.plan(tables).flatMap(lambda plan : plan.run(tables, scanner))
+
+    def plan(self, tables:list[Table]) -> Res[QueryPlan, Exception]:
+        """ The plan, compiled conditions included, is reused for as long as the query runs on the same tables """
+        if self._plan and all(ref() is table for ref, table in zip(self._plannedTables, tables)): return Res.Ok(self._plan)
+        if (plan := QueryPlan.build(self.tableNames, tables, self.wherePred, self.columnNames, self.orderBy, self.limit, self.offset,
+            self.groupBy, self.getAggregates())).isErr(): return plan
+
+        self._plan, self._plannedTables = plan.unwrap(), list(map(weakref.ref, tables))
+        return Res.Ok(self._plan)
+
+
+class PreparedQuery:
+    """ A query parsed once, with parameters in place of some of its values, which can then be run with any values """
+    class BindingErr(CustomErr): MSG = "Invalid parameters"
+
+    def __init__(self, query:Query, tableManager:TableManager) -> None:
+        self.query, self.tableManager = query, tableManager
+
+        parameterNames = list(dict.fromkeys(param.name for param in query.getParameters()))
+        self.positionalParamsAmt = sum(map(str.isdigit, parameterNames))
+        self.namedParams         = { name for name in parameterNames if not name.isdigit() }
+
+    def bind(self, *values:Literal, **namedValues:Literal) -> Res[Query, Exception]:
+        """
+        The values are type checked against the columns they are compared with right away, by planning the bound
+        query, so that running it never fails because of them.
+        """
+        if len(values) != self.positionalParamsAmt: return Res.Err(PreparedQuery.BindingErr(
+            f"expected {self.positionalParamsAmt} positional values but got {len(values)}"))
+
+        if (namesDiff := self.namedParams.symmetric_difference(namedValues)): return Res.Err(PreparedQuery.BindingErr(
+            f"named values must be given for exactly {sorted(self.namedParams)}, mismatching names: {sorted(namesDiff)}"))
+
+        allValues = { str(position) : value for position, value in enumerate(values) } | namedValues
+        for name, value in allValues.items():
+            if isinstance(value, bool) or not isinstance(value, int|str|datetime): return Res.Err(PreparedQuery.BindingErr(
+                f"value of parameter \"{name}\" must be an integer, a string or a date, got {type(value).__name__} instead"))
 
-    def _runSelectClause(self, table:Table) -> Res[Table, Schema.ColumnNameErr|Schema.ColumnNameCollisionErr]:
-        return table.select(self.columnNames)
+        boundQuery = self.query.bind(allValues)
+        if (tables := self.tableManager.getTables(boundQuery.tableNames)).isErr(): return tables
+        return boundQuery.plan(tables.unwrap()).map(lambda _ : boundQuery)
 
-    def _runWhereClause(self, table:Table) -> Res[Table, Schema.ColumnNameErr|SQLDomain.DomainValueErr]:
-        return table.where(self.wherePred) if self.wherePred else Res.Ok(table)
\ No newline at end of file
+    def run(self, *values:Literal, **namedValues:Literal) -> Res[Table, Exception]:
+        return self.bind(*values, **namedValues).flatMap(lambda query : query.run(self.tableManager))
@@ -0,0 +1,114 @@
+from Utils     import BaseClassErr, produceTableSepWithDivits
+from typing    import *
+import sys, io, csv, json, time
+from enum      import StrEnum
+from datetime  import datetime
+from itertools import batched, islice
+
+if TYPE_CHECKING: from SQLTable import Table
+
+ENTITY_SEP_IS_DISPLAYED = False
+
+class Renderer:
+    """
+    Writes tables to a text stream a chunk of rows at a time: each chunk is joined into a single string before being
+    written, so rendering takes linear time and never needs the whole output in memory.
+    """
+    class BCE(BaseClassErr): CLASS_NAME = "Renderer"
+
+    class Format(StrEnum):
+        TABLE = "table"
+        CSV   = "csv"
+        JSON  = "json" # JSON lines
+
+    ROWS_PER_CHUNK = 1024
+    def render(self, table:"Table", stream:TextIO, rowsLimit :Optional[int] = None, firstRowId = 0) -> int:
+        """ Renders at most rowsLimit rows (all of them by default) from the given one, returns the amount of rows left after them """
+        rowsAmt = table.getRowsAmount()
+        lastRowId = rowsAmt if rowsLimit is None else min(firstRowId + rowsLimit, rowsAmt)
+        rowsLeftAmt = rowsAmt - max(lastRowId, firstRowId)
+
+        stream.write(self.renderHeader(table))
+        rows = islice(table.iterRows(), lastRowId) if firstRowId == 0 else table.iterRows(range(firstRowId, lastRowId))
+        for rows in batched(rows, self.ROWS_PER_CHUNK):
+            stream.write(self.renderRows(table, rows))
+
+        stream.write(self.renderFooter(table, rowsLeftAmt))
+        return rowsLeftAmt
+
+    def renderHeader(self, table:"Table") -> str:
+        raise Renderer.BCE("renderHeader")
+
+    def renderRows(self, table:"Table", rows:Sequence[tuple]) -> str:
+        raise Renderer.BCE("renderRows")
+
+    def renderFooter(self, table:"Table", rowsLeftAmt:int) -> str:
+        """ Machine friendly formats don't tell about the rows left, as that would break their syntax """
+        return ""
+
+class BoxRenderer(Renderer):
+    """ Draws the table with box-drawing characters, every cell being as wide as the name of its column """
+    MIN_COLUMN_WIDTH = 10
+    def getColumnWidths(self, table:"Table") -> list[int]:
+        return [ max(len(name), BoxRenderer.MIN_COLUMN_WIDTH) for name in table.schema.getActualNames() ]
+
+    def renderHeader(self, table:"Table") -> str:
+        actualColumnSizes = [ width + 2 for width in self.getColumnWidths(table) ]
+        schemaLine = "".join([ f"│ {name.center(BoxRenderer.MIN_COLUMN_WIDTH)} " for name in table.schema.getActualNames() ]) + "│\n"
+        return ('┌' + produceTableSepWithDivits(actualColumnSizes, '┬') + "┐\n" + schemaLine +
+                ('├' + produceTableSepWithDivits(actualColumnSizes, '┼') + "┤\n") * (not ENTITY_SEP_IS_DISPLAYED))
+
+    def renderRows(self, table:"Table", rows:Sequence[tuple]) -> str:
+        widths  = self.getColumnWidths(table)
+        sepLine = ('├' + produceTableSepWithDivits([ width + 2 for width in widths ], '┼') + "┤\n") * ENTITY_SEP_IS_DISPLAYED
+        def renderCell(value:Any, width:int) -> str:
+            strValue = str(value)
+            return (strValue if len(strValue) <= width else strValue[:width - 3] + "...").center(width)
+
+        return "".join([ sepLine + "│ " + " │ ".join(map(renderCell, row, widths)) + " │\n" for row in rows ])
+
+    def renderFooter(self, table:"Table", rowsLeftAmt:int) -> str:
+        bottomLine = '└' + produceTableSepWithDivits([ width + 2 for width in self.getColumnWidths(table) ], '┴') + "┘\n"
+        return bottomLine + f"... {rowsLeftAmt} more row{'s' * (rowsLeftAmt != 1)}\n" * (rowsLeftAmt > 0)
+
+class CsvRenderer(Renderer):
+    """ Dates are written as in the tables files, so that results can be loaded back as tables """
+    def renderHeader(self, table:"Table") -> str:
+        return self.renderRows(table, [ tuple(table.schema.getActualNames()) ])
+
+    def renderRows(self, table:"Table", rows:Sequence[tuple]) -> str:
+        chunk = io.StringIO()
+        csv.writer(chunk, lineterminator = "\n").writerows(
+            [ value.strftime("%d/%m/%Y") if isinstance(value, datetime) else value for value in row ] for row in rows)
+        return chunk.getvalue()
+
+class JsonLinesRenderer(Renderer):
+    """ The first line holds the names of the columns and each of the following ones holds a row, dates are in ISO format """
+    def renderHeader(self, table:"Table") -> str:
+        return json.dumps(list(table.schema.getActualNames())) + "\n"
+
+    def renderRows(self, table:"Table", rows:Sequence[tuple]) -> str:
+        toJson = lambda value : value.date().isoformat() if isinstance(value, datetime) else value
+        return "".join([ json.dumps(list(map(toJson, row))) + "\n" for row in rows ])
+
+def makeRenderer(format:Renderer.Format) -> Renderer:
+    match format:
+        case Renderer.Format.TABLE: return BoxRenderer()
+        case Renderer.Format.CSV:   return CsvRenderer()
+        case Renderer.Format.JSON:  return JsonLinesRenderer()
+
+def main() -> None:
+    from SQLTable  import Table, Schema
+    from SQLDomain import IntegerDomain, StringDomain
+
+    schema = Schema()
+    for domain in (IntegerDomain("Id"), StringDomain("Name", 20)): schema.addColumn(domain)
+
+    table = Table.fromRows("People", schema, ( (i, f"Name, {i}") for i in range(200_000) ))
+    for format in Renderer.Format: makeRenderer(format).render(table, sys.stdout, rowsLimit = 3, firstRowId = 10)
+
+    start = time.perf_counter()
+    makeRenderer(Renderer.Format.TABLE).render(table, io.StringIO())
+    print(f"Rendered {table.getRowsAmount()} rows in {time.perf_counter() - start:.3f}s")
+
+if __name__ == "__main__": main()
@@ -20,7 +20,8 @@ class Schema:
     def copy(self) -> Self:
         inst = Schema()
         inst.domains     = self.domains.copy()
-        inst.__positions = self.__positions.copy()
+        inst.__positions = { name : ids.copy() for name, ids in self.__positions.items() }
+        # ^^^ the id lists must be copied too, otherwise adding a column to the copy alters the original.
         return inst
 
     def getColumnsAmount(self) -> int: return len(self.domains)
@@ -28,10 +29,44 @@ class Schema:
     def merge(left:Self, right:Self) -> Self:
         """Static"""
         mergedSchema = left.copy()
-        for domain in right.domains: mergedSchema.addColumn(domain)
+        offset       = left.getColumnsAmount()
+        mergedSchema.domains.extend(right.domains)
+        # Going through the positions instead of addColumn also carries over the qualified names:
+        for name, ids in right.__positions.items():
+            mergedSchema.__positions.setdefault(name, []).extend([ id + offset for id in ids ])
         
         return mergedSchema
 
+    def project(self, colIds:list[int]) -> Self:
+        """ Keeps only the given columns, in the given order, along with every name they can be reached by """
+        newIds = { oldId : newId for newId, oldId in enumerate(colIds) }
+
+        inst = Schema()
+        inst.domains = [ self.domains[cId] for cId in colIds ]
+        for name, ids in self.__positions.items():
+            if keptIds := [ newIds[id] for id in ids if id in newIds ]: inst.__positions[name] = keptIds
+        
+        return inst
+
+    def select(self, columnNames:list[str]) -> Res[tuple[Self, list[int]], "Schema.ColumnNameErr|Schema.ColumnNameCollisionErr"]:
+        """ Returns the schema of the given columns along with their ids, "*" standing for all of them """
+        newSchema = Schema()
+        selectedColumnsIds :list[int] = []
+        for columnName in columnNames:
+            if columnName == "*": return Res.Ok((self.copy(), list(range(self.getColumnsAmount()))))
+            if (selectedColumn := self.getIdAndDomain(columnName)).isErr(): return selectedColumn
+            
+            id, domain = selectedColumn.unwrap()
+            newSchema.addColumn(domain)
+            selectedColumnsIds.append(id)
+        
+        return Res.Ok((newSchema, selectedColumnsIds))
+
+    def qualify(self, tableName:str) -> None:
+        """ Makes every column also reachable as "tableName.columnName" """
+        for cId, domain in self.iterIdsAndDomains():
+            self.__positions[f"{tableName.lower()}.{domain.name}"] = [cId]
+
     def addColumn(self, domain:SQLDomain) -> None:
         normalizedDomainName = domain.name
         if normalizedDomainName not in self.__positions: self.__positions[normalizedDomainName] = []
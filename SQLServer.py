@@ -0,0 +1,118 @@
+from Utils              import Res
+from typing             import *
+import asyncio, io, json, struct, argparse
+from concurrent.futures import ThreadPoolExecutor
+from SQLInterpreter     import SQLInterpreter
+from SQLParallel        import ParallelScanner
+from SQLTable           import Table
+from SQLRenderer        import Renderer, makeRenderer
+from TableManager       import TableManager
+
+# Requests and responses are both sent as a 4 bytes big endian length followed by that many bytes of UTF-8 text.
+# A request is the text of a query, a response is a JSON object: { "status" : "ok", "rowsAmt" : ..., "result" : ... }
+# when the query succeeds, the result being rendered up to the rows limit of the server, and
+# { "status" : "error", "error" : ... } otherwise.
+MESSAGE_HEADER   = struct.Struct("!I")
+MAX_REQUEST_SIZE = 1 << 20 # bytes
+
+async def readMessage(reader:asyncio.StreamReader, maxSize :Optional[int] = None) -> Optional[str]:
+    """ Returns None once the other side closed the connection """
+    try:
+        (size,) = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+        if maxSize is not None and size > maxSize: raise ValueError(f"message of {size} bytes exceeds the maximum of {maxSize} bytes")
+        return (await reader.readexactly(size)).decode()
+
+    except asyncio.IncompleteReadError: return None
+
+def writeMessage(writer:asyncio.StreamWriter, message:str) -> None:
+    data = message.encode()
+    writer.write(MESSAGE_HEADER.pack(len(data)) + data)
+
+class SQLServer:
+    """
+    Serves queries to any amount of clients at once, all of them sharing the same tables. Queries are parsed and
+    planned on the event loop, which is cheap, while running them and rendering their results is left to a pool of
+    worker threads so that a long query never holds back the other clients.
+    """
+    WORKERS_AMT = 8
+    def __init__(self, tableManager:TableManager, workersAmt = WORKERS_AMT, scanner :Optional[ParallelScanner] = None,
+                 format = Renderer.Format.TABLE, rowsLimit :Optional[int] = SQLInterpreter.DISPLAYED_ROWS_LIMIT) -> None:
+        """ Results are sent rendered in the given format, showing at most rowsLimit rows (all of them when None) """
+        self.tableManager = tableManager
+        self.interpreter  = SQLInterpreter(tableManager, scanner = scanner)
+        self.executor     = ThreadPoolExecutor(workersAmt)
+        self.renderer, self.rowsLimit = makeRenderer(format), rowsLimit
+
+        # The table manager isn't thread safe, so tables are loaded one query at a time:
+        self.tablesLock = asyncio.Lock()
+
+    async def runQuery(self, programText:str) -> Res[Table, Exception]:
+        if (parsingRes := self.interpreter.parse(programText, isVerbose = False)).isErr(): return parsingRes
+
+        loop        = asyncio.get_running_loop()
+        parsedQuery = self.interpreter.parsedQuery
+        query       = parsedQuery.query
+        async with self.tablesLock:
+            # Loading tables can take a while, so it's not done on the event loop either:
+            if (tables := await loop.run_in_executor(self.executor, self.tableManager.getTables, query.tableNames)).isErr(): return tables
+
+            # Read along with the tables, as other clients may reload them while the query runs:
+            tableVersions = self.interpreter.getTableVersions(query)
+
+        tables = tables.unwrap()
+        if (plan := query.plan(tables)).isErr(): return plan
+
+        # The running query keeps its tables alive even if the table manager drops them in the meantime:
+        if (result := await loop.run_in_executor(self.executor, plan.unwrap().run, tables, self.interpreter.scanner)).isOk():
+            parsedQuery.tableVersions = tableVersions
+
+        return result
+
+    def makeResponse(self, result:Res[Table, Exception]) -> str:
+        if result.isErr(): return json.dumps({ "status" : "error", "error" : str(result.err) })
+
+        rendered = io.StringIO()
+        self.renderer.render(result.unwrap(), rendered, self.rowsLimit)
+        return json.dumps({ "status" : "ok", "rowsAmt" : result.unwrap().getRowsAmount(), "result" : rendered.getvalue() })
+
+    async def handleClient(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        """ Queries of a same client are run one after the other, so their responses come in the order they were sent """
+        try:
+            loop = asyncio.get_running_loop()
+            while (programText := await readMessage(reader, MAX_REQUEST_SIZE)) is not None:
+                result = await self.runQuery(programText)
+
+                # Rendering takes as long as the result is big, so it's not done on the event loop either:
+                writeMessage(writer, await loop.run_in_executor(self.executor, self.makeResponse, result))
+                await writer.drain()
+
+        except (ValueError, ConnectionError) as e: print(f"Dropped client: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, host :Optional[str] = None, port :Optional[int] = None, unixPath :Optional[str] = None) -> None:
+        """ Listens on the Unix socket when given its path, on the TCP port otherwise, until cancelled """
+        if unixPath: server = await asyncio.start_unix_server(self.handleClient, unixPath)
+        else:        server = await asyncio.start_server(self.handleClient, host, port)
+
+        print(f"Serving on {', '.join(map(str, (socket.getsockname() for socket in server.sockets)))}")
+        try:
+            async with server: await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures = True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Serves the tables of the tables folder to many clients at once.")
+    parser.add_argument("--host",    default = "127.0.0.1")
+    parser.add_argument("--port",    default = 5432, type = int)
+    parser.add_argument("--unix",    help = "path of a Unix socket to listen on instead of a TCP port")
+    parser.add_argument("--workers", default = SQLServer.WORKERS_AMT, type = int)
+    parser.add_argument("--format",  default = Renderer.Format.TABLE, type = Renderer.Format, choices = list(Renderer.Format))
+    parser.add_argument("--rows",    default = SQLInterpreter.DISPLAYED_ROWS_LIMIT, type = int, help = "most rows sent per result")
+    args = parser.parse_args()
+
+    server = SQLServer(TableManager.discover().unwrap(), args.workers, format = args.format, rowsLimit = args.rows)
+    try: asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt: print("Server stopped.")
+
+if __name__ == "__main__": main()
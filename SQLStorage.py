@@ -0,0 +1,124 @@
+from Utils     import Res, CustomErr
+from typing    import *
+import os, sys, json, mmap
+from SQLDomain import SQLDomain, IntegerDomain, StringDomain, DateDomain, parseDomain
+from SQLSchema import Schema
+from SQLColumn import Column, IntegerColumn, DateColumn, StringColumn
+from SQLTable  import Table
+from SQLZoneMap import ZoneMap
+
+# Binary table files are laid out as:
+#   MAGIC | the sections of every column | footer | footer offset (8 bytes)
+# where the footer is a JSON object holding the schema, and the offset and length of each section. Sections hold
+# the buffers of the columns as they are in memory, each one aligned to SECTION_ALIGNMENT bytes, so that reading
+# a column is just a matter of viewing the mapped file through the right type.
+MAGIC             = b"SNAKEQL\x01"
+SECTION_ALIGNMENT = 8
+BINARY_EXTENSION  = ".tbl"
+ZONE_MAPS_EXTENSION = ".zones"
+
+class TableFileErr(CustomErr):
+    MSG = "Invalid binary table file"
+    def __init__(self, path:str, details:str) -> None:
+        super().__init__(f"\"{path}\" {details}")
+
+def getColumnSections(column:Column) -> dict[str, bytes|memoryview]:
+    match column:
+        case IntegerColumn() | DateColumn(): return { "data"  : column.data }
+        case StringColumn():                 return { "codes" : column.codes, "values" : json.dumps(column.values).encode() }
+        case _:                              raise Column.BCE("getColumnSections")
+
+def writeTable(table:Table, path:str) -> Res[None, Exception]:
+    """ The file is written next to its destination and only then moved there, so a table file is never half-written """
+    def write() -> None:
+        with open(tmpPath := path + ".tmp", "wb") as fd:
+            fd.write(MAGIC)
+            columnsInfo :list[dict[str, Any]] = []
+            for domain, column in zip(table.schema.domains, table.columns):
+                sectionsInfo :dict[str, tuple[int, int]] = {}
+                for sectionName, section in getColumnSections(column).items():
+                    fd.write(b"\0" * (-fd.tell() % SECTION_ALIGNMENT))
+                    sectionsInfo[sectionName] = (fd.tell(), fd.write(section))
+
+                columnsInfo.append({ "name" : domain.actualName, "type" : domain.getTypeStr(), "sections" : sectionsInfo })
+
+            footerOffset = fd.tell()
+            fd.write(json.dumps({ "byteOrder" : sys.byteorder, "columns" : columnsInfo }).encode())
+            fd.write(footerOffset.to_bytes(8, sys.byteorder))
+
+        os.replace(tmpPath, path)
+
+    return Res.wrap(write)
+
+def readColumn(domain:SQLDomain, buffer:memoryview, sectionsInfo:dict[str, list[int]]) -> Column:
+    def getSection(name:str) -> memoryview:
+        offset, length = sectionsInfo[name]
+        return buffer[offset:offset + length]
+
+    match domain:
+        case IntegerDomain(): return IntegerColumn(getSection("data").cast('q'))
+        case DateDomain():    return DateColumn(getSection("data").cast('q'))
+        case StringDomain():
+            values = json.loads(bytes(getSection("values")))
+            return StringColumn(getSection("codes").cast('i'), values, { value : code for code, value in enumerate(values) })
+        case _: raise SQLDomain.BCE("readColumn")
+
+def openTable(name:str, path:str) -> Res[Table, Exception]:
+    """
+    Maps the file in memory instead of reading it: the integer and date columns and the codes of the string
+    columns are views on the mapped file, so their pages are only read from the disk once they are accessed. Only
+    the dictionaries of the string columns are read right away.
+    """
+    def mapTable() -> Res[Table, Exception]:
+        with open(path, "rb") as fd:
+            # The map stays valid once the file is closed, and it's released along with the last column using it:
+            buffer = memoryview(mmap.mmap(fd.fileno(), 0, access = mmap.ACCESS_READ))
+
+        if len(buffer) < len(MAGIC) + 8 or buffer[:len(MAGIC)] != MAGIC: return Res.Err(TableFileErr(path, "is not a table file"))
+
+        footerOffset = int.from_bytes(buffer[-8:], sys.byteorder)
+        footer       = json.loads(bytes(buffer[footerOffset:-8]))
+        if footer["byteOrder"] != sys.byteorder: return Res.Err(TableFileErr(path, f"was written with {footer['byteOrder']} endian byte order"))
+
+        schema, columns = Schema(), []
+        for columnInfo in footer["columns"]:
+            if (domain := parseDomain(columnInfo["name"], columnInfo["type"])).isErr(): return domain
+            schema.addColumn(domain.unwrap())
+            columns.append(readColumn(domain.unwrap(), buffer, columnInfo["sections"]))
+
+        schema.qualify(name)
+        return Res.Ok(Table(name, schema, columns))
+
+    return Res.wrap(mapTable).flatten()
+
+def writeZoneMaps(table:Table, path:str) -> Res[None, Exception]:
+    def write() -> None:
+        with open(path, "w") as fd: json.dump({
+            "blockSize" : ZoneMap.BLOCK_SIZE,
+            "rowsAmt"   : table.getRowsAmount(),
+            "columns"   : { colId : zoneMap.toDict() for colId, zoneMap in table.zoneMaps.items() }}, fd)
+
+    return Res.wrap(write)
+
+def readZoneMaps(table:Table, path:str) -> Res[dict[int, ZoneMap], Exception]:
+    """ The zone maps must have been computed on the same rows, with the same block size """
+    def read() -> Res[dict[int, ZoneMap], Exception]:
+        with open(path) as fd: zoneMapsDict = json.load(fd)
+
+        if zoneMapsDict["blockSize"] != ZoneMap.BLOCK_SIZE or zoneMapsDict["rowsAmt"] != table.getRowsAmount():
+            return Res.Err(TableFileErr(path, "doesn't match the table"))
+
+        return Res.Ok({ int(colId) : ZoneMap.fromDict(zoneMapDict) for colId, zoneMapDict in zoneMapsDict["columns"].items() })
+
+    return Res.wrap(read).flatten()
+
+def main() -> None:
+    schema = Schema()
+    for domain in (IntegerDomain("Id"), StringDomain("Name", 20)): schema.addColumn(domain)
+
+    table = Table.fromRows("People", schema, [ (0, "John Doe"), (1, "Alice Bob"), (2, "John Doe") ])
+    writeTable(table, path := "./People" + BINARY_EXTENSION).unwrap()
+    print(openTable("People", path).unwrap())
+    os.remove(path)
+
+if __name__ == "__main__": main()
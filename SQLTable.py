@@ -1,106 +1,172 @@
 from Utils        import *
 from typing       import *
+import io
+from itertools    import compress, batched, chain
 from Predicate    import *
 from SQLSchema    import Schema
-
-ENTITY_SEP_IS_DISPLAYED = False
+from SQLColumn    import Column, makeColumn
+from SQLIndex     import Index, makeIndex
+from SQLZoneMap   import ZoneMap
+from SQLRenderer  import BoxRenderer
 
 class Table:
-    MIN_COLUMN_WIDTH = 10
-    def __init__(self, name:str, schema:Schema, instance :list = []) -> None:
-        self.name, self.schema, self.instance = name, schema, instance
+    ROWS_BATCH_SIZE  = 4096
+    def __init__(self, name:str, schema:Schema, columns :Optional[list[Column]] = None) -> None:
+        """ The columns are owned by the table from now on, and tables never modify their columns once built """
+        self.name, self.schema = name, schema
+        self.columns = [ makeColumn(domain) for domain in schema.domains ] if columns is None else columns
+
+        self.indexes  :dict[int, list[Index]] = {} # by column id
+        self.zoneMaps :dict[int, ZoneMap]     = {} # by column id
 
         self._columnsAmt = self.schema.getColumnsAmount()
-        self._entriesAmt = len(instance) // self._columnsAmt
-        self.setGraphics()
+        self._entriesAmt = len(self.columns[0]) if self.columns else 0
 
-    def setGraphics(self):
-        columnNames           = list(self.schema.getActualNames())
-        self._columnNamesLens = list(map(lambda name : max(len(name), self.MIN_COLUMN_WIDTH), columnNames))
-        actualColumnSizes     = list(map(lambda l : l + 2, self._columnNamesLens))
-        
-        schemaLine         = "".join([ f"│ {name.center(self.MIN_COLUMN_WIDTH)} " for name in columnNames ]) + "│\n"
-        self.entrySepLine  = '├' + produceTableSepWithDivits(actualColumnSizes, '┼') + "┤\n"
-        self.bottomLine    = '└' + produceTableSepWithDivits(actualColumnSizes, '┴') + "┘\n"
-        self.schemaDisplay = '┌' + produceTableSepWithDivits(actualColumnSizes, '┬') + "┐\n" + schemaLine + self.entrySepLine * (not ENTITY_SEP_IS_DISPLAYED)
+    def getRowsAmount(self) -> int: return self._entriesAmt
 
     def getCell(self, rowId:int, colId:int) -> Any:
-        return self.instance[rowId * self._columnsAmt + colId]
+        return self.columns[colId][rowId]
 
     def getRow(self, rowId:int) -> list:
-        entryStartPos = rowId * self._columnsAmt
-        return self.instance[entryStartPos:entryStartPos + self._columnsAmt]
+        return [ column[rowId] for column in self.columns ]
 
     def getColumn(self, colId:int) -> list:
-        return self.instance[colId::self._columnsAmt]
+        return list(self.columns[colId])
 
     def select(self, columnNames:list[str]) -> Res[Self, Schema.ColumnNameErr|Schema.ColumnNameCollisionErr]:
-        newSchema = Schema()
-        selectedColumnsIds :list[int] = []
-        for columnName in columnNames:
-            if columnName == MathOp.MUL.value:
-                newSchema          = self.schema.copy()
-                selectedColumnsIds = list(range(self._columnsAmt))
-                break
-
-            if (selectedColumn := self.schema.getIdAndDomain(columnName)).isErr(): return selectedColumn
-            
-            id, domain = selectedColumn.unwrap()
-            newSchema.addColumn(domain)
-            selectedColumnsIds.append(id)
-
-        newInstance = []
-        for rowId in range(self._entriesAmt):
-            for columnId in selectedColumnsIds:
-                newInstance.append(self.getCell(rowId, columnId))
-
-        return Res.Ok(Table("", newSchema, newInstance))
-
-    def join(self, table:Self, pred:Optional[Predicate]) -> Res[Self, Schema.ColumnNameCollisionErr]:
-        """ Will perform the cartesian product if pred is None """
-        schema = Schema.merge( #TODO: solve collisions
-            self.schema.copy(),
-            table.schema.copy())
+        if (selection := self.schema.select(columnNames)).isErr(): return selection
+
+        # Columns are never modified, so they can be shared instead of copied:
+        newSchema, selectedColumnsIds = selection.unwrap()
+        return Res.Ok(Table("", newSchema, [ self.columns[columnId] for columnId in selectedColumnsIds ]))
+
+    def project(self, colIds:list[int]) -> Self:
+        """ Like select, but by column ids and keeping the qualified names of the columns """
+        return Table(self.name, self.schema.project(colIds), [ self.columns[colId] for colId in colIds ])
+
+    def where(self, cond:Condition) -> Res[Self, Exception]:
+        return self.findRowsWhere(self.orderConditions(cond.getConjuncts())).map(self.take)
+
+    def findRowsWhere(self, conds:list[Condition]) -> Res[list[int], Exception]:
+        """
+        Returns the ids of the rows satisfying all the conditions, which are checked in the given order: when the
+        first one is a predicate it finds its rows a whole column at a time, then the others are checked on each of
+        those rows, stopping at the first one that doesn't hold.
+        """
+        pred = conds[0] if conds and isinstance(conds[0], Predicate) else None
+        if (rowIds := self.findRows(pred) if pred else Res.Ok(range(self._entriesAmt))).isErr(): return rowIds
+        if not (otherConds := conds[1:] if pred else conds): return rowIds
+
+        rowIds = rowIds.unwrap()
+        return makeLogicExpr(LogicOp.AND, otherConds).compile(self.schema).flatMap(
+            lambda evaluator : Res.wrap(lambda : list(compress(rowIds, map(evaluator, self.iterRows(rowIds))))))
+
+    def orderConditions(self, conds:list[Condition]) -> list[Condition]:
+        """
+        Orders conditions that must all hold so that they're the fastest to check. The predicate expected to keep
+        the fewest rows goes first, as checking a whole column at a time (or using an index) beats any other
+        condition, then the others follow in order of rank, see rankConditions.
+        """
+        conds = rankConditions(conds, self.estimateSelectivity)
+        preds = [ cond for cond in conds if isinstance(cond, Predicate) and cond.resolve(self.schema).isOk() ]
+        if not preds: return conds
+
+        # Among equally selective predicates, those with an index win:
+        pred = min(preds, key = lambda pred : (pred.estimateSelectivity(self.estimateSelectivity),
+            self.getIndex(pred.resolve(self.schema).unwrap()[0], pred.op) is None))
+
+        return [pred] + [ cond for cond in conds if cond is not pred ]
+
+    def estimateSelectivity(self, pred:Predicate) -> Optional[float]:
+        """ Estimated from the zone maps for predicates comparing a column with a value, None for the others """
+        if (resolvedPred := pred.resolve(self.schema)).isErr(): return None
+
+        colId, domain, otherColId = resolvedPred.unwrap()
+        if otherColId is not None or (zoneMap := self.zoneMaps.get(colId)) is None: return None
+        return zoneMap.estimateSelectivity(pred.op, self.columns[colId].toKey(domain, pred.value), self._entriesAmt)
+
+    def findRows(self, pred:Predicate) -> Res[list[int], Exception]:
+        """
+        Returns the ids of the rows satisfying pred. The domain and the operator are resolved once and then the
+        whole column is compared in a single pass, instead of going through Predicate.isSatisfied for each row.
+        """
+        return self.iterFoundRows(pred).map(list)
+
+    def iterFoundRows(self, pred:Predicate) -> Res[Iterator[int], Exception]:
+        """ Lazy version of findRows """
+        if (resolvedPred := pred.resolve(self.schema)).isErr(): return resolvedPred
+
+        colId, domain, otherColId = resolvedPred.unwrap()
+        column, compare = self.columns[colId], pred.op.getOperator()
+        if otherColId is None and (index := self.getIndex(colId, pred.op)):
+            return Res.Ok(iter(index.findRows(pred.op, column.toKey(domain, pred.value))))
+
+        if otherColId is None:
+            # Only the blocks whose range of values can satisfy the predicate are gone through:
+            rowRanges = self.getCandidateRanges(colId, domain, pred)
+            return Res.Ok(column.iterFoundRows(domain, compare, pred.value, rowRanges))
         
-        instance = []
-        for rowIdL in range(self._entriesAmt):
-            leftRow = self.getRow(rowIdL)
-            for rowIdR in range(table._entriesAmt):
-                instance.extend(leftRow + table.getRow(rowIdR))
-        
-        return Res.Ok(Table("", schema, instance))
+        return Res.Ok(compress(range(self._entriesAmt), map(compare, column.iterKeys(domain), self.columns[otherColId].iterKeys(domain))))
+
+    def getCandidateRanges(self, colId:int, domain:SQLDomain, pred:Predicate) -> Optional[list[range]]:
+        """ The ranges of rows that can satisfy a predicate comparing the column with a value, None when they all can """
+        zoneMap = self.zoneMaps.get(colId)
+        return zoneMap and zoneMap.getCandidateRanges(pred.op, self.columns[colId].toKey(domain, pred.value), self._entriesAmt)
 
-    def where(self, pred:Predicate) -> Res[Self, Schema.ColumnNameErr|SQLDomain.DomainValueErr]:
-        if (column := self.schema.getIdAndDomain(pred.attr.name)).isErr(): return column
+    def createIndex(self, columnName:str, kind:Index.Kind) -> Res[None, Exception]:
+        if (column := self.schema.getIdAndDomain(columnName)).isErr(): return column
 
         colId, domain = column.unwrap()
-        if not domain.canValidate(pred.value):
-            return Res.Err(SQLDomain.DomainValueErr(domain, pred.value, f"invalid predicate comparing attribute \"{pred.attr.name}\" of type {domain.TYPE} with value \"{pred.value}\" of type {type(pred.value)}"))
+        return makeIndex(kind, self.columns[colId], domain).map(self.indexes.setdefault(colId, []).append)
 
-        newInstance = []
-        for rowId in range(self._entriesAmt):
-            if pred.isSatisfied(domain, self.getCell(rowId, colId)):
-                newInstance.extend(self.getRow(rowId))
+    def buildZoneMaps(self) -> None:
+        self.zoneMaps = { colId : zoneMap for colId, (column, domain) in enumerate(zip(self.columns, self.schema.domains))
+            if (zoneMap := ZoneMap.build(column, domain)) is not None }
 
-        return Res.Ok(Table("", self.schema.copy(), newInstance))
+    def withIndex(self, colId:int, index:Index) -> Self:
+        """ Returns a table sharing everything with this one, with one more index """
+        table = Table(self.name, self.schema, self.columns)
+        table.zoneMaps = self.zoneMaps
+        table.indexes  = { cId : indexes.copy() for cId, indexes in self.indexes.items() }
+        table.indexes.setdefault(colId, []).append(index)
+        return table
 
-    def __repr__(self) -> str:
-        tableStr = self.schemaDisplay
-        for y in range(self._entriesAmt):
-            tableStr += self.entrySepLine * ENTITY_SEP_IS_DISPLAYED
-            for x in range(self._columnsAmt):
-                strValue      = str(self.instance[x + y * self._columnsAmt])
-                columnNameLen = self._columnNamesLens[x]
+    def getIndex(self, colId:int, op:CompareOp) -> Optional[Index]:
+        return next(( index for index in self.indexes.get(colId, []) if index.supports(op) ), None)
 
-                if len(strValue) > columnNameLen: strValue = strValue[:columnNameLen - 3] + "..."
-                tableStr += f"│ {strValue.center(columnNameLen)} "
+    def iterRows(self, rowIds :Optional[Iterable[int]] = None, colIds :Optional[list[int]] = None) -> Iterator[tuple]:
+        """ Lazily yields the rows at the given ids (all of them by default) as tuples, only made of the given columns """
+        columns = self.columns if colIds is None else [ self.columns[colId] for colId in colIds ]
+        if rowIds is None: return zip(*columns)
 
-            tableStr += "│\n"
+        # Going a batch of rows at a time lets each column be gathered in one go:
+        getters = [ column.__getitem__ for column in columns ]
+        return chain.from_iterable(zip(*[ map(get, batch) for get in getters ]) for batch in batched(rowIds, Table.ROWS_BATCH_SIZE))
 
-        return tableStr + self.bottomLine
+    def fromRows(name:str, schema:Schema, rows:Iterable[Sequence]) -> Self:
+        """ Static, consumes the rows a batch at a time so that they never have to be all in memory at once """
+        columns = [ makeColumn(domain) for domain in schema.domains ]
+        for batch in batched(rows, Table.ROWS_BATCH_SIZE):
+            for column, values in zip(columns, zip(*batch)): column.extend(values)
+
+        return Table(name, schema, columns)
+
+    def getMemoryUsage(self) -> int:
+        """ Approximate, in bytes """
+        return sum(column.getMemoryUsage() for column in self.columns) + sum(
+            index.getMemoryUsage() for indexes in self.indexes.values() for index in indexes)
+
+    def take(self, rowIds:Iterable[int]) -> Self:
+        """ Returns a table made of the rows at the given ids, in the given order """
+        return Table("", self.schema.copy(), [ column.take(rowIds) for column in self.columns ])
+
+    def __repr__(self) -> str:
+        tableStr = io.StringIO()
+        BoxRenderer().render(self, tableStr)
+        return tableStr.getvalue()
 
-    def copy(self) -> str:
-        return Table(self.name, self.schema.copy(), self.instance.copy())
+    def copy(self) -> Self:
+        return Table(self.name, self.schema.copy(), [ column.copy() for column in self.columns ])
 
 def main() -> None:
     pass
@@ -0,0 +1,94 @@
+from typing    import *
+from itertools import batched
+from SQLDomain import SQLDomain, IntegerDomain, StringDomain, DateDomain
+from SQLColumn import Column, makeColumn
+from Predicate import CompareOp
+
+class ZoneMap:
+    """
+    Statistics about each block of BLOCK_SIZE rows of a column, computed on the keys Column.iterKeys gives. A
+    block whose keys range doesn't overlap with what a comparison accepts can be skipped without reading its rows.
+    """
+    BLOCK_SIZE = 4096
+    def __init__(self, mins:list[Hashable], maxs:list[Hashable], nullsAmts:list[int], distinctAmts:list[int]) -> None:
+        self.mins, self.maxs, self.nullsAmts, self.distinctAmts = mins, maxs, nullsAmts, distinctAmts
+
+    def build(column:Column, domain:SQLDomain) -> Optional[Self]:
+        """ Static, only integer, date and varchar columns have zone maps """
+        if not isinstance(domain, (IntegerDomain, StringDomain, DateDomain)): return None
+
+        zoneMap = ZoneMap([], [], [], [])
+        for block in batched(column.iterKeys(domain), ZoneMap.BLOCK_SIZE):
+            zoneMap.mins.append(min(block))
+            zoneMap.maxs.append(max(block))
+            zoneMap.nullsAmts.append(0) # there are no nulls (yet)
+            zoneMap.distinctAmts.append(len(set(block)))
+
+        return zoneMap
+
+    def getBlocksAmount(self) -> int: return len(self.mins)
+
+    def mayContain(self, blockId:int, op:CompareOp, key:Hashable) -> bool:
+        """ Whether some rows of the block might compare with the key as the operator says """
+        blockMin, blockMax = self.mins[blockId], self.maxs[blockId]
+        match op:
+            case CompareOp.EQUALS:                           return blockMin <= key <= blockMax
+            case CompareOp.NOT_EQUALS | CompareOp.DIFFERENT: return not (blockMin == blockMax == key)
+            case CompareOp.GREATER_EQUALS:                   return blockMax >= key
+            case CompareOp.LESS_EQUALS:                      return blockMin <= key
+            case CompareOp.GREATER:                          return blockMax > key
+            case CompareOp.LESS:                             return blockMin < key
+
+    def estimateSelectivity(self, op:CompareOp, key:Hashable, rowsAmt:int) -> float:
+        """
+        The estimated fraction of rows that compare with the key as the operator says. Within a block, distinct keys
+        are assumed to be equally frequent and numbers to be spread evenly between the minimum and the maximum.
+        """
+        if not rowsAmt: return 0
+
+        satisfyingAmt = 0.0
+        for blockId in range(self.getBlocksAmount()):
+            if not self.mayContain(blockId, op, key): continue
+
+            blockMin, blockMax, distinctAmt = self.mins[blockId], self.maxs[blockId], self.distinctAmts[blockId]
+            match op:
+                case CompareOp.EQUALS:                           fraction = 1 / distinctAmt
+                case CompareOp.NOT_EQUALS | CompareOp.DIFFERENT: fraction = 1 - (blockMin <= key <= blockMax) / distinctAmt
+                case _ if not self.mayContain(blockId, op.getNegated(), key): fraction = 1 # the whole block satisfies it
+                case _ if isinstance(key, int) and blockMin != blockMax:
+                    fraction = (key - blockMin if op in (CompareOp.LESS, CompareOp.LESS_EQUALS) else blockMax - key) / (blockMax - blockMin)
+                case _:                                          fraction = 1 / 2
+
+            satisfyingAmt += fraction * (min((blockId + 1) * ZoneMap.BLOCK_SIZE, rowsAmt) - blockId * ZoneMap.BLOCK_SIZE)
+
+        return satisfyingAmt / rowsAmt
+
+    def getCandidateRanges(self, op:CompareOp, key:Hashable, rowsAmt:int) -> list[range]:
+        """ The ranges of rows of the blocks that can't be skipped, with the adjacent ones merged """
+        ranges :list[range] = []
+        for blockId in range(self.getBlocksAmount()):
+            if not self.mayContain(blockId, op, key): continue
+
+            start, end = blockId * ZoneMap.BLOCK_SIZE, min((blockId + 1) * ZoneMap.BLOCK_SIZE, rowsAmt)
+            if ranges and ranges[-1].stop == start: ranges[-1] = range(ranges[-1].start, end)
+            else:                                   ranges.append(range(start, end))
+
+        return ranges
+
+    def toDict(self) -> dict[str, list]:
+        return { "mins" : self.mins, "maxs" : self.maxs, "nullsAmts" : self.nullsAmts, "distinctAmts" : self.distinctAmts }
+
+    def fromDict(zoneMapDict:dict[str, list]) -> Self:
+        """ Static """
+        return ZoneMap(zoneMapDict["mins"], zoneMapDict["maxs"], zoneMapDict["nullsAmts"], zoneMapDict["distinctAmts"])
+
+def main() -> None:
+    domain = IntegerDomain("SId")
+    column = makeColumn(domain)
+    column.extend(range(10000))
+
+    zoneMap = ZoneMap.build(column, domain)
+    print(zoneMap.mins, zoneMap.maxs, zoneMap.getCandidateRanges(CompareOp.GREATER, 5000, len(column)))
+    print([ f"{op} 5000: {zoneMap.estimateSelectivity(op, 5000, len(column)):.3f}" for op in CompareOp ])
+
+if __name__ == "__main__": main()
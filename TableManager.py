@@ -1,23 +1,79 @@
-from Utils     import Res
+import os, csv
+from Utils     import Res, LRUCache
+from itertools import batched
 from SQLTable  import *
 from SQLDomain import parseDomain
+from SQLColumn import makeColumn
+from SQLStorage import *
+from SQLIndex  import Index
 
 class TableManager:
-    def __init__(self, loadedTables:dict[str, Table]) -> None:
-        """ Private constructor """
-        self.loadedTables = loadedTables
-    
+    """
+    Knows which tables are in the database but only loads each of them the first time it's requested. Once the
+    loaded tables take more memory than the budget, the least recently used ones are dropped (and will be loaded
+    again if they're requested later on).
+    """
+    TABLES_FOLDER         = "./Tables"
+    DEFAULT_MEMORY_BUDGET = 1 << 30 # bytes
+    def __init__(self, tableNames:dict[str, str], memoryBudget :Optional[int] = DEFAULT_MEMORY_BUDGET) -> None:
+        """ Private constructor, tableNames maps the lowercase name of each table to the name of its file """
+        self.tableNames   = tableNames
+        self.loadedTables :LRUCache[str, Table] = LRUCache(memoryBudget, Table.getMemoryUsage)
+        self.indexesDefs  :dict[str, list[tuple[str, Index.Kind]]] = {} # rebuilt whenever their table is loaded again
+        self.versions     :dict[str, int] = {} # bumped whenever a table is (re)loaded, so results computed on an older version are never reused
+
+    def discover(memoryBudget :Optional[int] = DEFAULT_MEMORY_BUDGET) -> Res[Self, Exception]:
+        """ Static, finds every table in the tables folder without loading any of them """
+        return Res.wrap(os.listdir, TableManager.TABLES_FOLDER).map(lambda fileNames : TableManager({
+            name.lower() : name for name, ext in map(os.path.splitext, fileNames) if ext in (".csv", BINARY_EXTENSION) }, memoryBudget))
+
     def create(*tablesToLoad:str) -> Res[Self, Exception]:
-        """ Static """
-        return Res.toOverallDict({ name.lower() : loadTable(name) for name in tablesToLoad }).map(TableManager)
+        """ Static, the given tables are loaded right away and no other table is available """
+        tableManager = TableManager({ name.lower() : name for name in tablesToLoad }, None)
+        return tableManager.getTables(list(tablesToLoad)).map(lambda _ : tableManager)
 
     def getTable(self, name:str) -> Res[Table, Exception]:
-        return Res.wrap(lambda : self.loadedTables[name.lower()]
-        ).mapErr(lambda _ : Exception(f"Table \"{name}\" either isn't in the database or hasn't been loaded."))
+        if (table := self.loadedTables.get(name.lower())) is not None: return Res.Ok(table)
+        if name.lower() not in self.tableNames:
+            return Res.Err(Exception(f"Table \"{name}\" either isn't in the database or hasn't been loaded."))
+
+        if (table := loadTable(self.tableNames[name.lower()])).isErr(): return table
+        for columnName, kind in self.indexesDefs.get(name.lower(), []):
+            if (index := table.unwrap().createIndex(columnName, kind)).isErr(): return index
+
+        self.loadedTables.put(name.lower(), table.unwrap())
+        self.versions[name.lower()] = self.getVersion(name) + 1
+        return table
+
+    def reloadTable(self, name:str) -> Res[Table, Exception]:
+        """ Loads the table again from its files, e.g. after they changed """
+        self.loadedTables.pop(name.lower())
+        return self.getTable(name)
 
     def getTables(self, names:list[str]) -> Res[list[Table], Exception]:
         return Res.toOverallList(map(self.getTable, names))
 
+    def createIndex(self, tableName:str, columnName:str, kind = Index.Kind.HASH) -> Res[None, Exception]:
+        """ Hash indexes speed up equalities, sorted ones also range comparisons """
+        if (table := self.getTable(tableName)).isErr(): return table
+        if (index := table.unwrap().createIndex(columnName, kind)).isErr(): return index
+
+        self.indexesDefs.setdefault(tableName.lower(), []).append((columnName, kind))
+        self.loadedTables.put(tableName.lower(), table.unwrap()) # its size changed
+        return Res.Ok(None)
+
+    def getVersion(self, name:str) -> int:
+        """ 0 until the table is loaded for the first time """
+        return self.versions.get(name.lower(), 0)
+
+    def isLoaded(self, name:str) -> bool:
+        return name.lower() in self.loadedTables
+
+    def convertTables(self) -> Res[list[str], Exception]:
+        """ Writes the binary file of every table that has a CSV file, returns the names of the converted tables """
+        return Res.toOverallList([ convertTable(name).map(lambda _, name = name : name)
+            for name in self.tableNames.values() if os.path.exists(getTablePath(name, ".csv")) ])
+
 class SubfolderAccessErr(CustomErr):
     MSG = "Table access paths must always be plain file names and cannot contain the \"/\" character"
     def __init__(self, path:str) -> None:
@@ -28,20 +84,53 @@ class UnknownTableErr(CustomErr):
     def __init__(self, tableName:str) -> None:
         super().__init__(f"Couldn't recognize \"{tableName}\" as one of the available tables in the database")
 
-def retrieveRawTableFromLoc(filename:str) -> Res[str, SubfolderAccessErr|UnknownTableErr]:
+def getTablePath(name:str, extension:str) -> str:
+    return f"{TableManager.TABLES_FOLDER}/{name}{extension}"
+
+def openTableFile(filename:str) -> Res[TextIO, SubfolderAccessErr|UnknownTableErr]:
     # Prevent subfolder access:
     if '/' in filename: return Res.Err(SubfolderAccessErr(filename))
 
-    with open(f"./Tables/{filename}.csv") as fd:
-        return Res.wrap(fd.read).mapErr(lambda e : UnknownTableErr(filename))
+    # The csv module needs newline = "" to handle line breaks inside quoted cells:
+    return Res.wrap(lambda : open(getTablePath(filename, ".csv"), newline = "")
+    ).mapErr(lambda _ : UnknownTableErr(filename))
+
+def isFileNewer(path:str, *otherPaths:str) -> bool:
+    """ Whether the file exists and is newer than each of the other files that exist """
+    return os.path.exists(path) and all(
+        os.path.getmtime(path) > os.path.getmtime(otherPath) for otherPath in otherPaths if os.path.exists(otherPath))
 
 def loadTable(name:str) -> Res[Table, Exception]:
-    if (tableRows := retrieveRawTableFromLoc(name)).isErr(): return tableRows
-    tableRows = tableRows.unwrap().split('\n')
+    if '/' in name: return Res.Err(SubfolderAccessErr(name))
+
+    binaryPath = getTablePath(name, BINARY_EXTENSION)
+    table      = openTable(name, binaryPath) if isFileNewer(binaryPath, getTablePath(name, ".csv")) else loadCsvTable(name)
+    return table.map(lambda table : loadZoneMaps(name, table))
+
+def loadZoneMaps(name:str, table:Table) -> Table:
+    """ Reuses the zone maps saved next to the table when they are up to date, otherwise builds and saves them """
+    path = getTablePath(name, ZONE_MAPS_EXTENSION)
+    if isFileNewer(path, getTablePath(name, ".csv"), getTablePath(name, BINARY_EXTENSION)) and (zoneMaps := readZoneMaps(table, path)).isOk():
+        table.zoneMaps = zoneMaps.unwrap()
+        return table
+
+    # Failing to save them only means that they'll be built again the next time:
+    table.buildZoneMaps()
+    writeZoneMaps(table, path)
+    return table
+
+def convertTable(name:str) -> Res[None, Exception]:
+    return loadCsvTable(name).flatMap(lambda table : writeTable(table, getTablePath(name, BINARY_EXTENSION)))
 
-    columnNames  = tableRows[0].split(",")
-    typeMetadata = tableRows[1].split(",")
-    if (columnsAmt := len(columnNames)) != len(typeMetadata):
+def loadCsvTable(name:str) -> Res[Table, Exception]:
+    if (fd := openTableFile(name)).isErr(): return fd
+    with fd.unwrap() as fd:
+        # The reader raises csv.Error on malformed files while it's being iterated over:
+        return Res.wrap(readTable, name, csv.reader(fd)).flatten()
+
+def readSchema(name:str, rows:Iterator[list[str]]) -> Res[Schema, Exception]:
+    columnNames, typeMetadata = next(rows, []), next(rows, [])
+    if not columnNames or len(columnNames) != len(typeMetadata):
         return Res.Err(Exception("Invalid schema: the amount of column names and domains must match."))
 
     schema = Schema()
@@ -50,20 +139,37 @@ def loadTable(name:str) -> Res[Table, Exception]:
         schema.addColumn(domain.unwrap())
     
     #TODO: check for collisions in the schema domain names
+    schema.qualify(name)
+    return Res.Ok(schema)
 
-    instance = []
-    for entry in tableRows[2:]:
-        entryValues = entry.split(',')
-        if (rowSize := len(entryValues)) != columnsAmt: return Res.Err(Exception(
-            f"Row length does not match table schema, expected {columnsAmt} cells but got {rowSize}."))
-    
-        for valueStr, (_, domain) in zip(entryValues, schema.iterIdsAndDomains()):
-            if (value := domain.parseValue(valueStr)).isErr(): return value
-            instance.append(value.unwrap())
+def readTable(name:str, rows:Iterator[list[str]]) -> Res[Table, Exception]:
+    """
+    Rows are parsed a batch at a time as they are read, straight into the columns of the table, so the text of
+    the file is never all in memory at once.
+    """
+    if (schema := readSchema(name, rows)).isErr(): return schema
+    schema     = schema.unwrap()
+    columnsAmt = schema.getColumnsAmount()
+
+    columns = [ makeColumn(domain) for domain in schema.domains ]
+    rowId   = 0
+    for batch in batched(filter(None, rows), Table.ROWS_BATCH_SIZE): # blank lines come as empty rows
+        for batchRowId, entryValues in enumerate(batch, rowId):
+            if (rowSize := len(entryValues)) != columnsAmt: return Res.Err(Exception(
+                f"Row length does not match table schema, expected {columnsAmt} cells but got {rowSize} at row {batchRowId}."))
+
+        # Each column of the batch is parsed in one go:
+        for column, domain, valueStrs in zip(columns, schema.domains, zip(*batch)):
+            if (values := domain.parseValues(valueStrs, rowId)).isErr(): return values
+            column.extend(values.unwrap())
+
+        rowId += len(batch)
     
-    return Res.Ok(Table(name, schema, instance))
+    return Res.Ok(Table(name, schema, columns))
 
 def main() -> None:
-    print(TableManager.create("Student").unwrap().loadedTables["student"].name)
+    # Converts every table to the binary format, which is then used whenever it's newer than the CSV file:
+    tableManager = TableManager.discover().unwrap()
+    print("Converted tables:", tableManager.convertTables().unwrap())
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -1,4 +1,5 @@
-from typing import *
+from typing      import *
+from collections import OrderedDict
 
 def compareCaseInsensitive(s1:str, s2:str) -> bool: return s1.lower() == s2.lower()
 def formatIntoDetails(details:str, sep = ',') -> str:  return f"{sep} {details}" * bool(details)
@@ -83,6 +84,58 @@ class Res[T, E:Exception]:
         variant, content = ("Ok", self.value) if self.isOk() else ("Err", self.err)
         return f"Result::{repr(variant)}({repr(content)})"
 
+class LRUCache[K, V]:
+    """ Once the total cost of the entries exceeds the budget, the least recently used ones are evicted """
+    def __init__(self, budget :Optional[int] = None, getCost :Callable[[V], int] = lambda _ : 1) -> None:
+        """ A budget of None means the cache is unbounded """
+        self.budget, self.getCost = budget, getCost
+        self.totalCost = 0
+        self.hits = self.misses = self.invalidations = 0
+        self._entries :OrderedDict[K, tuple[V, int]] = OrderedDict()
+
+    def get(self, key:K, isValid :Optional[Callable[[V], bool]] = None) -> Optional[V]:
+        """ An entry that isValid rejects is dropped, and counts as a miss """
+        if (entry := self._entries.get(key)) is not None and isValid and not isValid(entry[0]):
+            self.invalidations += 1
+            self.pop(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key:K, value:V) -> list[tuple[K, V]]:
+        """ Returns the evicted entries, the new one is never evicted even when it exceeds the budget on its own """
+        self.pop(key)
+        self._entries[key] = (value, cost := self.getCost(value))
+        self.totalCost    += cost
+
+        evicted :list[tuple[K, V]] = []
+        while self.budget is not None and self.totalCost > self.budget and len(self._entries) > 1:
+            evictedKey, (evictedValue, evictedCost) = self._entries.popitem(last = False)
+            self.totalCost -= evictedCost
+            evicted.append((evictedKey, evictedValue))
+        
+        return evicted
+
+    def pop(self, key:K) -> Optional[V]:
+        if (entry := self._entries.pop(key, None)) is None: return None
+
+        self.totalCost -= entry[1]
+        return entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.totalCost = 0
+
+    def keys(self) -> KeysView[K]: return self._entries.keys()
+    def __contains__(self, key:K) -> bool: return key in self._entries
+    def __len__(self) -> int: return len(self._entries)
+
 def main() -> None:
     pass
 
@@ -0,0 +1,30 @@
+import unittest
+from datetime  import datetime
+from SQLDomain import SQLDomain, IntegerDomain, StringDomain, DateDomain
+
+class TestParseValues(unittest.TestCase):
+    def test_validColumns(self) -> None:
+        self.assertEqual(IntegerDomain("Id").parseValues(["1", "-2", "30"]).unwrap(), [1, -2, 30])
+        self.assertEqual(StringDomain("Name", 5).parseValues(["a", "bcdef"]).unwrap(), ["a", "bcdef"])
+        self.assertEqual(DateDomain("Date").parseValues(["01/02/2003", "01/02/2003"]).unwrap(), [datetime(2003, 2, 1)] * 2)
+
+    def test_invalidValueNamesItsRow(self) -> None:
+        err = IntegerDomain("Id").parseValues(["1", "2", "three"], firstRowId = 10).err
+        self.assertIsInstance(err, SQLDomain.DomainValueErr)
+        self.assertIn("\"three\" at row 12", str(err))
+
+        err = StringDomain("Name", 3).parseValues(["abc", "abcd"]).err
+        self.assertIsInstance(err, SQLDomain.DomainValueErr)
+        self.assertIn("\"abcd\" at row 1", str(err))
+
+    def test_columnOnlyInvalidInBulk(self) -> None:
+        # When the bulk conversion fails but every value parses on its own, no value is blamed:
+        class StrictDomain(IntegerDomain):
+            def convertValues(self, valueStrs:list[str]) -> list[int]: raise ValueError("duplicated values")
+
+        err = StrictDomain("Id").parseValues(["1", "1"], firstRowId = 5).err
+        self.assertIsInstance(err, SQLDomain.DomainColumnErr)
+        self.assertIn("rows 5 to 6", str(err))
+        self.assertIn("duplicated values", str(err))
+
+if __name__ == "__main__": unittest.main()
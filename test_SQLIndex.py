@@ -0,0 +1,71 @@
+import unittest
+from datetime       import datetime
+from Predicate      import Predicate, Attribute, CompareOp
+from SQLDomain      import IntegerDomain, StringDomain, DateDomain
+from SQLSchema      import Schema
+from SQLTable       import Table
+from SQLIndex       import Index
+from TableManager   import TableManager
+from SQLInterpreter import SQLInterpreter
+
+def makeTable(rows:list[tuple]) -> Table:
+    schema = Schema()
+    for domain in (IntegerDomain("Id"), StringDomain("Name", 20), DateDomain("Date")): schema.addColumn(domain)
+    return Table.fromRows("People", schema, rows)
+
+ROWS = [ (i % 13 - 3, ("Bob", "bob", "ALICE", "carl", "", "Zoë")[i % 6], datetime.fromordinal(730_000 + i % 17 * 3)) for i in range(500) ]
+
+# For each column, values below, at and above its extremes, in between its values and missing from it:
+KEYS = {
+    "Id":   [ -10, -3, -2, 0, 4, 9, 10 ],
+    "Name": [ "", "ALICE", "alice", "BOB", "Bobby", "carl", "CARL", "zoë", "ZZZ", "a" ],
+    "Date": [ datetime.fromordinal(730_000 + days) for days in (-1, 0, 1, 3, 24, 48, 49) ] }
+
+class TestSQLIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.table = makeTable(ROWS)
+
+    def assertSameRows(self, kind:Index.Kind) -> None:
+        indexedTable = makeTable(ROWS)
+        for columnName in KEYS: indexedTable.createIndex(columnName, kind).unwrap()
+
+        for columnName, keys in KEYS.items():
+            for op in CompareOp:
+                colId = self.table.schema.getIdAndDomain(columnName).unwrap()[0]
+                # != and <> are never answered by an index, and ranges only by sorted ones, but they must all find the same rows:
+                self.assertEqual(indexedTable.getIndex(colId, op) is not None, op == CompareOp.EQUALS or
+                    kind == Index.Kind.SORTED and op not in (CompareOp.NOT_EQUALS, CompareOp.DIFFERENT))
+
+                for key in keys:
+                    pred = Predicate(Attribute(columnName), op, key)
+                    self.assertEqual(indexedTable.findRows(pred).unwrap(), self.table.findRows(pred).unwrap(), f"{columnName} {op} {key!r}")
+
+    def test_hashIndex(self) -> None:
+        self.assertSameRows(Index.Kind.HASH)
+
+    def test_sortedIndex(self) -> None:
+        self.assertSameRows(Index.Kind.SORTED)
+
+    def test_indexedQueries(self) -> None:
+        # Through queries, with the indexed predicate combined with other conditions and on either side of the comparison:
+        queries = [
+            "select * from Student where SId = 3;",
+            "select * from Student where 3 <= SId and SId < 7;",
+            "select * from Student where SId > 95 or SId <= 0;",
+            "select * from Student where SId between 10 and 12 and SId <> 11;",
+            "select * from Student where SId != 50 and SId >= 98;",
+            "select * from Student where SId < -1;",
+            "select * from Student where SId > 99;" ]
+        interpreter     = SQLInterpreter(TableManager.create("Student").unwrap())
+        expectedResults = [ interpreter.prepare(query).unwrap().run().unwrap() for query in queries ]
+
+        for kind in Index.Kind:
+            tableManager = TableManager.create("Student").unwrap()
+            tableManager.createIndex("Student", "SId", kind).unwrap()
+            interpreter = SQLInterpreter(tableManager)
+
+            for query, expectedResult in zip(queries, expectedResults):
+                result = interpreter.prepare(query).unwrap().run().unwrap()
+                self.assertEqual(list(result.iterRows()), list(expectedResult.iterRows()), f"{kind}: {query}")
+
+if __name__ == "__main__": unittest.main()
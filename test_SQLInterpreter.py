@@ -0,0 +1,48 @@
+import unittest
+from TableManager   import TableManager
+from SQLInterpreter import SQLInterpreter
+from SQLAggregate   import Accumulator
+
+class TestSQLInterpreter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.interpreter = SQLInterpreter(TableManager.create("Student").unwrap())
+
+    def getSIds(self, table) -> list[int]:
+        return table.getColumn(table.schema.getIdAndDomain("SId").unwrap()[0])
+
+    def test_prepareKeepsParameterNames(self) -> None:
+        # Named parameters spelling a keyword must not share a parsed query with the ones differing in case:
+        lowerQuery = self.interpreter.prepare("select SId from Student where SId < :limit;").unwrap()
+        upperQuery = self.interpreter.prepare("select SId from Student where SId < :LIMIT;").unwrap()
+
+        self.assertEqual(self.getSIds(lowerQuery.run(limit = 3).unwrap()), [0, 1, 2])
+        self.assertEqual(self.getSIds(upperQuery.run(LIMIT = 2).unwrap()), [0, 1])
+
+    def test_runBatchSharesOnlyIdenticalProducts(self) -> None:
+        # Without a space before FROM, the queries used to be told apart by their text after " FROM ", i.e. not at all:
+        lowResult, highResult = self.interpreter.runBatch([
+            "select *from Student where SId < 2;",
+            "select *from Student where SId > 97;" ])
+
+        self.assertEqual(self.getSIds(lowResult.unwrap()), [0, 1])
+        self.assertEqual(self.getSIds(highResult.unwrap()), [98, 99])
+
+    def test_runBatchSharesProducts(self) -> None:
+        nameResult, sIdResult = self.interpreter.runBatch([
+            "select Name from Student where SId < 2;",
+            "select SId from Student where SId < 2;" ])
+
+        self.assertEqual(nameResult.unwrap().getRowsAmount(), 2)
+        self.assertEqual(self.getSIds(sIdResult.unwrap()), [0, 1])
+
+    def test_aggregateWithoutRows(self) -> None:
+        # Without GROUP BY there's a single group, even when no row makes it into it:
+        (result,) = self.interpreter.runBatch([ "select count(SId), sum(SId) from Student where SId < 0;" ])
+        self.assertEqual(list(result.unwrap().iterRows()), [ (0, 0) ])
+
+        # There are no NULLs to stand for the extremes or the average of no values:
+        for aggregate in ("min(Name)", "max(SId)", "avg(SId)"):
+            (result,) = self.interpreter.runBatch([ f"select count(*), {aggregate} from Student where SId < 0;" ])
+            self.assertIsInstance(result.err, Accumulator.EmptyErr)
+
+if __name__ == "__main__": unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+from SQLDomain    import IntegerDomain, StringDomain
+from SQLSchema    import Schema
+from SQLTable     import Table
+from SQLOperators import ScanOp, JoinOp, HashJoinOp
+
+def makeTable(name:str, rows:list[tuple]) -> Table:
+    schema = Schema()
+    for domain in (IntegerDomain("Id"), StringDomain("Name", 20)): schema.addColumn(domain)
+    return Table.fromRows(name, schema, rows)
+
+class TestHashJoinOp(unittest.TestCase):
+    def assertJoinsLikeProduct(self, left:Table, right:Table, colId:int) -> None:
+        """ The join must give the rows of the filtered cartesian product, in the same order """
+        domain  = left.schema.domains[colId]
+        product = JoinOp(ScanOp(left, [0, 1]), ScanOp(right, [0, 1]))
+        expectedRows = [ row for row in product if domain.toComparable(row[colId]) == domain.toComparable(row[2 + colId]) ]
+        self.assertEqual(list(HashJoinOp(ScanOp(left, [0, 1]), ScanOp(right, [0, 1]), colId, colId, domain)), expectedRows)
+
+    def test_eitherSideSmaller(self) -> None:
+        small = makeTable("Small", [ (i % 7, f"Name {i % 5}") for i in range(20) ])
+        large = makeTable("Large", [ (i % 11, f"name {i % 13}") for i in range(300) ])
+        for left, right in ((small, large), (large, small), (small, small)):
+            for colId in (0, 1): self.assertJoinsLikeProduct(left, right, colId)
+
+    def test_emptySides(self) -> None:
+        empty, table = makeTable("Empty", []), makeTable("Table", [ (1, "a"), (2, "b") ])
+        for left, right in ((empty, table), (table, empty), (empty, empty)): self.assertJoinsLikeProduct(left, right, 0)
+
+if __name__ == "__main__": unittest.main()
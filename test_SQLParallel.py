@@ -0,0 +1,54 @@
+import unittest, os, tempfile
+from Predicate    import Predicate, Attribute, CompareOp
+from SQLDomain    import IntegerDomain, StringDomain
+from SQLSchema    import Schema
+from SQLTable     import Table
+from SQLStorage   import writeTable, openTable, BINARY_EXTENSION
+from SQLOperators import ScanOp, HashJoinOp
+from SQLParallel  import ParallelScanner, ParallelJoinOp
+
+def makeTable(name:str, rows:list[tuple]) -> Table:
+    schema = Schema()
+    for domain in (IntegerDomain("Id"), StringDomain("Name", 20)): schema.addColumn(domain)
+    return Table.fromRows(name, schema, rows)
+
+class TestSQLParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.scanner = ParallelScanner(2, partitionSize = 4096, minRowsAmt = 4096)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.scanner.close()
+
+    def assertSameRows(self, table:Table, expectedTable:Table) -> None:
+        self.assertEqual(list(table.iterRows()), list(expectedTable.iterRows()))
+
+    def test_whereOnMappedTable(self) -> None:
+        # The columns of a mapped table are views on its file, which can't be sent to the workers as they are:
+        for distinctNamesAmt in (10, 50_000):
+            table = makeTable("People", [ (i, f"Name {i % distinctNamesAmt}") for i in range(50_000) ])
+            with tempfile.TemporaryDirectory() as folder:
+                writeTable(table, path := os.path.join(folder, "People" + BINARY_EXTENSION)).unwrap()
+                mappedTable = openTable("People", path).unwrap()
+
+                for pred in (Predicate(Attribute("Name"), CompareOp.EQUALS, "name 3"), Predicate(Attribute("Id"), CompareOp.LESS, 20_000)):
+                    self.assertTrue(self.scanner.isWorthIt(mappedTable, [pred]))
+                    self.assertSameRows(self.scanner.where(mappedTable, pred).unwrap(), table.where(pred).unwrap())
+
+    def test_failedTaskKeepsPool(self) -> None:
+        with self.assertRaises(TypeError): self.scanner.submit(len, memoryview(b"unpicklable"))
+
+        table = makeTable("People", [ (i, f"Name {i}") for i in range(10_000) ])
+        pred  = Predicate(Attribute("Id"), CompareOp.GREATER_EQUALS, 5_000)
+        self.assertSameRows(self.scanner.where(table, pred).unwrap(), table.where(pred).unwrap())
+
+    def test_consecutiveJoins(self) -> None:
+        # Each join must match its rows against its own right side, never one kept by the workers from a previous join:
+        left = makeTable("Left", [ (i % 100, f"Left {i}") for i in range(2_000) ])
+        for rightRows in ([ (i, f"Right {i}") for i in range(0, 100, 2) ], [ (i, f"Other {i}") for i in range(1, 100, 3) ]):
+            right = makeTable("Right", rightRows)
+            makeJoin = lambda : HashJoinOp(ScanOp(left, [0, 1]), ScanOp(right, [0, 1]), 0, 0, IntegerDomain("Id"))
+            self.assertEqual(list(ParallelJoinOp(makeJoin(), self.scanner)), list(makeJoin()))
+
+if __name__ == "__main__": unittest.main()
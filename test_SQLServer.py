@@ -0,0 +1,23 @@
+import unittest, asyncio, json
+from TableManager import TableManager
+from SQLServer    import SQLServer
+
+class TestSQLServer(unittest.TestCase):
+    def query(self, server:SQLServer, programText:str) -> dict:
+        async def run() -> str: return server.makeResponse(await server.runQuery(programText))
+        return json.loads(asyncio.run(run()))
+
+    def test_resultIsCutAtRowsLimit(self) -> None:
+        server   = SQLServer(TableManager.create("Student").unwrap(), 2, rowsLimit = 3)
+        response = self.query(server, "select SId from Student where SId < 10;")
+
+        self.assertEqual(response["status"], "ok")
+        self.assertEqual(response["rowsAmt"], 10)
+        self.assertIn("7 more rows", response["result"])
+        self.assertEqual(response["result"].count("\n"), 3 + 3 + 2) # header, rows, then bottom line and rows left
+
+    def test_errorResponse(self) -> None:
+        server = SQLServer(TableManager.create("Student").unwrap(), 2)
+        self.assertEqual(self.query(server, "select Nope from Student;")["status"], "error")
+
+if __name__ == "__main__": unittest.main()
@@ -0,0 +1,138 @@
+import unittest, os, tempfile
+from datetime     import datetime
+from Predicate    import Predicate, Attribute, CompareOp
+from SQLDomain    import IntegerDomain, StringDomain, DateDomain
+from SQLSchema    import Schema
+from SQLTable     import Table
+from SQLZoneMap   import ZoneMap
+from SQLStorage   import TableFileErr, writeTable, openTable, writeZoneMaps, readZoneMaps, BINARY_EXTENSION, ZONE_MAPS_EXTENSION
+from SQLParallel  import ParallelScanner
+from TableManager import TableManager
+
+BLOCK_SIZE = ZoneMap.BLOCK_SIZE
+
+def makeTable(rows:list[tuple]) -> Table:
+    schema = Schema()
+    for domain in (IntegerDomain("Id"), StringDomain("Name", 20), DateDomain("Date")): schema.addColumn(domain)
+    return Table.fromRows("People", schema, rows)
+
+def makeRow(i:int) -> tuple:
+    return i, f"Name {i % 50}", datetime.fromordinal(730_000 + i % 400)
+
+class TestTableFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.path   = os.path.join(self.folder.name, "People" + BINARY_EXTENSION)
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_roundTrip(self) -> None:
+        rows  = [ (-1, "", datetime(1, 1, 1)), (2**40, "Zoë \"quoted\", 'comma'", datetime(2001, 9, 11)), (0, "Zoë", datetime(9999, 12, 31)) ]
+        table = makeTable(rows + [ makeRow(i) for i in range(10_000) ])
+        writeTable(table, self.path).unwrap()
+        mappedTable = openTable("People", self.path).unwrap()
+
+        self.assertEqual([ domain.getTypeStr() for domain in mappedTable.schema.domains ], ["integer", "varchar(20)", "date"])
+        self.assertEqual(list(mappedTable.iterRows()), list(table.iterRows()))
+
+        # The columns are views on the mapped file, and the string dictionaries are kept as they were:
+        self.assertIsInstance(mappedTable.columns[0].data, memoryview)
+        self.assertEqual(mappedTable.columns[1].values, table.columns[1].values)
+        self.assertEqual(mappedTable.columns[1].codesByValue, table.columns[1].codesByValue)
+
+    def test_mappedTableOperations(self) -> None:
+        table = makeTable([ makeRow(i) for i in range(3 * BLOCK_SIZE) ])
+        writeTable(table, self.path).unwrap()
+        mappedTable = openTable("People", self.path).unwrap()
+
+        for pred in (Predicate(Attribute("Name"), CompareOp.EQUALS, "name 7"), Predicate(Attribute("Id"), CompareOp.GREATER, 5000),
+                     Predicate(Attribute("Date"), CompareOp.LESS_EQUALS, datetime.fromordinal(730_010))):
+            self.assertEqual(list(mappedTable.where(pred).unwrap().iterRows()), list(table.where(pred).unwrap().iterRows()))
+
+        rows = range(BLOCK_SIZE - 3, BLOCK_SIZE + 3)
+        for column, mappedColumn in zip(table.columns, mappedTable.columns):
+            self.assertEqual(list(mappedColumn.slice(rows)), list(column.slice(rows)))
+            self.assertEqual(list(mappedColumn.take([5, 1, 5])), list(column.take([5, 1, 5])))
+
+    def test_parallelScanOnMappedTable(self) -> None:
+        table = makeTable([ makeRow(i) for i in range(4 * BLOCK_SIZE) ])
+        writeTable(table, self.path).unwrap()
+        mappedTable, pred = openTable("People", self.path).unwrap(), Predicate(Attribute("Name"), CompareOp.NOT_EQUALS, "name 3")
+
+        with ParallelScanner(2, partitionSize = BLOCK_SIZE, minRowsAmt = BLOCK_SIZE) as scanner:
+            self.assertEqual(list(scanner.where(mappedTable, pred).unwrap().iterRows()), list(table.where(pred).unwrap().iterRows()))
+
+    def test_invalidFile(self) -> None:
+        with open(self.path, "wb") as fd: fd.write(b"Id,Name\n" * 10)
+        self.assertIsInstance(openTable("People", self.path).err, TableFileErr)
+
+class TestZoneMaps(unittest.TestCase):
+    def setUp(self) -> None:
+        # The ids are sorted, so each block holds its own range of ids, while every block holds every name:
+        self.table = makeTable([ makeRow(i) for i in range(4 * BLOCK_SIZE + 100) ])
+        self.table.buildZoneMaps()
+
+    def test_roundTrip(self) -> None:
+        with tempfile.TemporaryDirectory() as folder:
+            writeZoneMaps(self.table, path := os.path.join(folder, "People" + ZONE_MAPS_EXTENSION)).unwrap()
+            zoneMaps = readZoneMaps(self.table, path).unwrap()
+            self.assertEqual({ colId : zoneMap.toDict() for colId, zoneMap in zoneMaps.items() },
+                             { colId : zoneMap.toDict() for colId, zoneMap in self.table.zoneMaps.items() })
+
+            # Zone maps computed on other rows can't be used:
+            self.assertIsInstance(readZoneMaps(makeTable([ makeRow(0) ]), path).err, TableFileErr)
+
+    def test_blocksAreSkipped(self) -> None:
+        getRanges = lambda op, value : self.table.getCandidateRanges(0, self.table.schema.domains[0], Predicate(Attribute("Id"), op, value))
+        self.assertEqual(getRanges(CompareOp.LESS, 10), [ range(BLOCK_SIZE) ])
+        self.assertEqual(getRanges(CompareOp.EQUALS, 2 * BLOCK_SIZE + 1), [ range(2 * BLOCK_SIZE, 3 * BLOCK_SIZE) ])
+        self.assertEqual(getRanges(CompareOp.GREATER_EQUALS, 3 * BLOCK_SIZE), [ range(3 * BLOCK_SIZE, 4 * BLOCK_SIZE + 100) ])
+        self.assertEqual(getRanges(CompareOp.GREATER, 10 * BLOCK_SIZE), [])
+
+        # Every block can hold any name:
+        namePred = Predicate(Attribute("Name"), CompareOp.EQUALS, "NAME 7")
+        self.assertEqual(self.table.getCandidateRanges(1, self.table.schema.domains[1], namePred), [ range(4 * BLOCK_SIZE + 100) ])
+
+    def test_partitionsAreSkipped(self) -> None:
+        scanner = ParallelScanner(1, partitionSize = BLOCK_SIZE // 2)
+        try:
+            pred = Predicate(Attribute("Id"), CompareOp.LESS, BLOCK_SIZE + 10)
+            self.assertEqual(scanner.getPartitions(self.table, [pred]), [ range(start, start + BLOCK_SIZE // 2)
+                for start in range(0, 2 * BLOCK_SIZE, BLOCK_SIZE // 2) ])
+
+        finally: scanner.close()
+
+    def test_skippingKeepsResults(self) -> None:
+        unmappedTable = makeTable([ makeRow(i) for i in range(4 * BLOCK_SIZE + 100) ])
+        for op in CompareOp:
+            for value in (-1, 0, BLOCK_SIZE - 1, BLOCK_SIZE, 3 * BLOCK_SIZE + 50, 10 * BLOCK_SIZE):
+                pred = Predicate(Attribute("Id"), op, value)
+                self.assertEqual(self.table.findRows(pred).unwrap(), unmappedTable.findRows(pred).unwrap(), f"{op} {value}")
+
+class TestTableManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder, self.tablesFolder = tempfile.TemporaryDirectory(), TableManager.TABLES_FOLDER
+        TableManager.TABLES_FOLDER = self.folder.name
+        with open(os.path.join(self.folder.name, "People.csv"), "w") as fd:
+            fd.write("Id,Name,Date\ninteger,varchar(20),date\n" + "".join(
+                f"{i},\"Name, {i % 7}\",{(i % 28) + 1:02}/02/2001\n" for i in range(5000)))
+
+        # Files written later on must be newer than the CSV file even on file systems with a coarse time resolution:
+        os.utime(fd.name, (0, 0))
+
+    def tearDown(self) -> None:
+        TableManager.TABLES_FOLDER = self.tablesFolder
+        self.folder.cleanup()
+
+    def test_convertedTableIsMapped(self) -> None:
+        csvTable = TableManager.discover().unwrap().getTable("People").unwrap()
+        self.assertEqual(TableManager.discover().unwrap().convertTables().unwrap(), ["People"])
+
+        binaryTable = TableManager.discover().unwrap().getTable("People").unwrap()
+        self.assertIsInstance(binaryTable.columns[0].data, memoryview)
+        self.assertEqual(list(binaryTable.iterRows()), list(csvTable.iterRows()))
+        self.assertEqual(list(binaryTable.schema.getActualNames()), list(csvTable.schema.getActualNames()))
+        self.assertEqual(set(binaryTable.zoneMaps), {0, 1, 2})
+
+if __name__ == "__main__": unittest.main()